@@ -0,0 +1,55 @@
+"""Check that the table fingerprints distinguish the missing values and reject unstable values.
+
+Usage: python scripts/check_fingerprint.py
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from sm.inputs.column import Column
+from sm.inputs.table import ColumnBasedTable
+from tum.lib.fingerprint import CHUNK_SIZE, fingerprint_table
+
+
+def make_table(values: list) -> ColumnBasedTable:
+    return ColumnBasedTable("table", [Column(0, "value", values)])
+
+
+def main():
+    columns = {
+        "none": [None, 1.5],
+        "nan": [float("nan"), 1.5],
+        "numpy nan": [np.float32("nan"), 1.5],
+        "inf": [float("inf"), 1.5],
+        "-inf": [float("-inf"), 1.5],
+        "empty string": ["", 1.5],
+        "null string": ["null", 1.5],
+    }
+    fingerprints = {
+        name: fingerprint_table(make_table(values)) for name, values in columns.items()
+    }
+    # the NaNs of python and numpy are the same missing value
+    assert fingerprints["nan"] == fingerprints["numpy nan"], fingerprints
+    del fingerprints["numpy nan"]
+    assert len(set(fingerprints.values())) == len(fingerprints), fingerprints
+
+    # the fingerprint is stable and a value changed after the first chunk is detected
+    values = [f"v{i}" for i in range(CHUNK_SIZE + 10)]
+    fingerprint = fingerprint_table(make_table(values))
+    assert fingerprint_table(make_table(list(values))) == fingerprint
+    values[-1] = None
+    assert fingerprint_table(make_table(values)) != fingerprint
+
+    # objects without a stable representation cannot be fingerprinted
+    try:
+        fingerprint_table(make_table([object()]))
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("fingerprinting an object must raise TypeError")
+
+    print("The fingerprints distinguish", ", ".join(fingerprints))
+
+
+if __name__ == "__main__":
+    main()
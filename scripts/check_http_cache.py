@@ -0,0 +1,121 @@
+"""Exercise HttpCache against a local stub HTTP server (an httpx.MockTransport).
+
+Usage: python scripts/check_http_cache.py
+
+The stub serves files with different caching headers and counts the requests, so the check fails if a
+fresh response is requested again, if a stale response is not revalidated with its ETag/Last-Modified,
+or if a modified file is served from the cache.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+from tum.lib.http_cache import HttpCache
+
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+class StubServer:
+    def __init__(self):
+        # path -> (content, headers)
+        self.files: dict[str, tuple[bytes, dict[str, str]]] = {
+            # must be revalidated before being reused
+            "/etag.ttl": (b"etag v1", {"ETag": '"v1"', "Cache-Control": "no-cache"}),
+            "/last-modified.ttl": (
+                b"last-modified v1",
+                {"Last-Modified": LAST_MODIFIED},
+            ),
+            # fresh for a long time
+            "/fresh.ttl": (b"fresh v1", {"Cache-Control": "max-age=3600"}),
+            # fresh for 1 second, then revalidated
+            "/expiring.ttl": (
+                b"expiring v1",
+                {"ETag": '"v1"', "Cache-Control": "max-age=1"},
+            ),
+        }
+        self.requests = Counter()
+        self.not_modified = Counter()
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.requests[path] += 1
+        if path not in self.files:
+            return httpx.Response(404, text=f"Not found: {path}")
+
+        content, headers = self.files[path]
+        if (
+            "ETag" in headers
+            and request.headers.get("If-None-Match") == headers["ETag"]
+        ) or (
+            "Last-Modified" in headers
+            and request.headers.get("If-Modified-Since") == headers["Last-Modified"]
+        ):
+            self.not_modified[path] += 1
+            return httpx.Response(304, headers=headers)
+        return httpx.Response(200, content=content, headers=headers)
+
+
+def main():
+    stub = StubServer()
+    urls = [f"http://kg.test{path}" for path in stub.files]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = HttpCache(Path(tmpdir), transport=httpx.MockTransport(stub.handle))
+
+        # first fetch: everything is downloaded, a URL listed twice is requested once
+        contents = cache.fetch_many(urls + urls[:1])
+        assert contents == [stub.files[path][0] for path in stub.files] + [b"etag v1"]
+        assert all(n == 1 for n in stub.requests.values()), stub.requests
+        assert cache.stats() == {"hits": 0, "revalidated": 0, "misses": 4}
+
+        # second fetch: the fresh responses are reused without a request, the others are revalidated
+        assert cache.fetch_many(urls) == contents[:-1]
+        assert stub.requests["/fresh.ttl"] == 1
+        assert stub.requests["/expiring.ttl"] == 1
+        assert stub.not_modified["/etag.ttl"] == 1
+        assert stub.not_modified["/last-modified.ttl"] == 1
+        assert cache.stats() == {"hits": 2, "revalidated": 2, "misses": 4}
+
+        # after max-age, the response is revalidated with its ETag
+        time.sleep(1.1)
+        assert cache.fetch("http://kg.test/expiring.ttl") == b"expiring v1"
+        assert stub.not_modified["/expiring.ttl"] == 1
+
+        # a modified file is downloaded again
+        stub.files["/etag.ttl"] = (
+            b"etag v2",
+            {"ETag": '"v2"', "Cache-Control": "no-cache"},
+        )
+        assert cache.fetch("http://kg.test/etag.ttl") == b"etag v2"
+        assert cache.fetch("http://kg.test/etag.ttl") == b"etag v2"
+        assert stub.not_modified["/etag.ttl"] == 2
+
+        # the cache is persisted on disk
+        cache2 = HttpCache(Path(tmpdir), transport=httpx.MockTransport(stub.handle))
+        assert cache2.fetch("http://kg.test/fresh.ttl") == b"fresh v1"
+        assert cache2.stats()["hits"] == 1
+
+        # fetch_many can be called from a running event loop (e.g., in a notebook)
+        async def fetch_in_loop():
+            return cache.fetch_many(urls)
+
+        assert asyncio.run(fetch_in_loop()) == [b"etag v2"] + contents[1:-1]
+
+        try:
+            cache.fetch("http://kg.test/missing.ttl")
+        except httpx.HTTPStatusError:
+            pass
+        else:
+            raise AssertionError("fetching a missing file must raise an error")
+
+    print("HttpCache works with the stub server:", dict(stub.requests))
+
+
+if __name__ == "__main__":
+    main()
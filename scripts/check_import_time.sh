@@ -0,0 +1,24 @@
+#!/bin/bash
+# Fail if importing a module takes longer than the budget (in seconds).
+# Usage: ./scripts/check_import_time.sh [module] [budget]
+
+set -e
+
+MODULE=${1:-tum.dag}
+BUDGET=${2:-${TUM_IMPORT_BUDGET:-1.0}}
+
+python - "$MODULE" "$BUDGET" <<'PY'
+import importlib
+import sys
+import time
+
+module, budget = sys.argv[1], float(sys.argv[2])
+start = time.perf_counter()
+importlib.import_module(module)
+elapsed = time.perf_counter() - start
+
+print(f"import {module}: {elapsed:.3f}s (budget: {budget:.3f}s)")
+if elapsed > budget:
+    print(f"importing {module} exceeds the budget, run `python -X importtime -c 'import {module}'` to find the slow imports")
+    sys.exit(1)
+PY
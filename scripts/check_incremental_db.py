@@ -0,0 +1,126 @@
+"""Check that the local backend of `build_partitioned_dataset` writes deterministic partitions with
+the checksum computed by Spark, and that both backends write the same dataset when pyspark is installed.
+
+Usage: python scripts/check_incremental_db.py
+"""
+
+from __future__ import annotations
+
+import tempfile
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
+
+import orjson
+import serde.json
+from kgdata.dataset import Dataset
+from kgdata.spark.extended_rdd import ExtendedRDD
+from tum.lib.incremental_db import (
+    build_partitioned_dataset,
+    compute_checksum,
+    iter_partition,
+)
+
+
+def build_partition(infile: str) -> Iterator[bytes]:
+    for i, line in enumerate(Path(infile).read_text().splitlines()):
+        yield orjson.dumps({"id": f"{Path(infile).stem}:{i}", "value": line})
+
+
+def build_partitions(
+    infiles: Sequence[str], workers: Optional[int] = None
+) -> Iterator[tuple[str, Iterable[bytes]]]:
+    for infile in reversed(infiles):
+        yield infile, build_partition(infile)
+
+
+class ListRDD:
+    """The two methods of a RDD used by `ExtendedRDD.hash`, on a list of partitions"""
+
+    def __init__(self, partitions: list[list]):
+        self.partitions = partitions
+
+    def map(self, fn):
+        return ListRDD([[fn(x) for x in part] for part in self.partitions])
+
+    def fold(self, zero, op):
+        result = zero
+        for part in self.partitions:
+            acc = zero
+            for x in part:
+                acc = op(acc, x)
+            result = op(result, acc)
+        return result
+
+
+def get_dataset(outdir: Path) -> Dataset:
+    return Dataset(
+        outdir / "*.gz", deserialize=orjson.loads, name="records", dependencies=[]
+    )
+
+
+def get_checksum(ds: Dataset) -> str:
+    return serde.json.deser(ds.get_data_directory() / "_SIGNATURE")["checksum"]
+
+
+def read_dataset(ds: Dataset) -> dict[str, list[bytes]]:
+    return {Path(file).name: list(iter_partition(file)) for file in ds.get_files()}
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        indir = Path(tmpdir) / "inputs"
+        indir.mkdir()
+        for i in range(5):
+            (indir / f"file{i}.txt").write_text(
+                "\n".join(f"line {j} of file {i}" for j in range(10 * (i % 3) + 1))
+            )
+        infiles = sorted(indir.iterdir())
+
+        local = get_dataset(Path(tmpdir) / "local")
+        build_partitioned_dataset(local, infiles, build_partition, "local", workers=2)
+        records = read_dataset(local)
+        assert len(records) == len(infiles)
+
+        # the same records give the same bytes, whoever writes them
+        other = get_dataset(Path(tmpdir) / "other")
+        build_partitioned_dataset(
+            other, infiles, build_partition, "local", build_partitions=build_partitions
+        )
+        assert read_dataset(other) == records
+        for file in local.get_files():
+            # no modification time in the gzip header
+            assert Path(file).read_bytes()[4:8] == bytes(4), file
+            assert (other.get_data_directory() / Path(file).name).read_bytes() == (
+                Path(file).read_bytes()
+            ), file
+
+        # the checksum is the one computed by spark
+        checksum = compute_checksum(local.get_files())
+        assert get_checksum(local) == get_checksum(other) == checksum
+        rdd = ExtendedRDD(ListRDD(list(records.values())), local.get_signature())
+        assert rdd.hash().hex() == checksum
+
+        # a modified input rebuilds its partition with the same content as a new build
+        infiles[0].write_text("modified")
+        build_partitioned_dataset(local, infiles, build_partition, "local")
+        fresh = get_dataset(Path(tmpdir) / "fresh")
+        build_partitioned_dataset(fresh, infiles, build_partition, "local")
+        assert sorted(sum(read_dataset(local).values(), [])) == sorted(
+            sum(read_dataset(fresh).values(), [])
+        )
+        assert get_checksum(local) == get_checksum(fresh)
+
+        if find_spec("pyspark") is None:
+            print("pyspark is not installed, skip the comparison with spark")
+        else:
+            spark = get_dataset(Path(tmpdir) / "spark")
+            build_partitioned_dataset(spark, infiles, build_partition, "spark")
+            assert read_dataset(spark) == read_dataset(fresh)
+            assert get_checksum(spark) == get_checksum(fresh)
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
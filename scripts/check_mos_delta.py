@@ -0,0 +1,92 @@
+"""Check that re-mapping an unchanged MOS file reports no changes.
+
+Usage: python scripts/check_mos_delta.py <file.ttl> [--dup-record-id]
+
+The file is mapped once, then mapped again in the delta mode against the first output: without the
+fingerprints of the records (all sites are mapped and compared), and with them (only the changed records
+are mapped). The lists of the first output are reversed before the comparison, as the order of the
+inventories, deposit types, etc. depends on the order of the triples in the parsed graph. A new trusted
+link is saved between the runs, which must not change the fingerprints of the records either.
+
+The trusted links are copied to a temporary file, so the check does not modify them.
+"""
+
+from __future__ import annotations
+
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import tum.map_mos
+from tum.lib.linking_cache import LinkingCache
+from tum.lib.trust_store import TrustStore
+from tum.map_mos import (
+    MosMapping,
+    get_fingerprint_file,
+    map_file_delta,
+    read_fingerprints,
+    read_sites,
+    write_sites,
+)
+
+CREATED_BY = "https://minmod.isi.edu/users/s/check-mos-delta"
+
+
+def reverse_lists(value):
+    if isinstance(value, dict):
+        return {k: reverse_lists(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [reverse_lists(v) for v in reversed(value)]
+    return value
+
+
+def save_new_trusted_link(trust_file: Path):
+    """Append a link of a text that is not in the trusted links to the journal of the trust file, as
+    `UnitAndCommodityTrustedLinker.link(..., save_link=True)` does"""
+    store = TrustStore(trust_file)
+    record = next(iter(store.load().values()))
+    store.append([{**record, "value": f"check-mos-delta {len(store.load())}"}])
+
+
+def main(infile: str, dup_record_ids: bool):
+    cache = LinkingCache()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        trust_file = Path(tmpdir) / tum.map_mos.TRUSTED_LINKS_FILE.name
+        shutil.copyfile(tum.map_mos.TRUSTED_LINKS_FILE, trust_file)
+        tum.map_mos.TRUSTED_LINKS_FILE = trust_file
+
+        first = Path(tmpdir) / "first" / "data.json"
+        first.parent.mkdir()
+        sites = MosMapping.map(infile, dup_record_ids, CREATED_BY, cache)
+        write_sites([reverse_lists(site) for site in sites], first)
+        assert not get_fingerprint_file(first).exists()
+
+        previous = first
+        for run in ["without fingerprints", "with fingerprints"]:
+            outfile = Path(tmpdir) / run.replace(" ", "-") / "data.json"
+            delta = map_file_delta(
+                infile, outfile, previous, dup_record_ids, CREATED_BY, cache
+            )
+            print(
+                f"Delta {run}: {len(delta.added)} added, {len(delta.changed)} changed, "
+                f"{len(delta.removed)} removed, {len(delta.unchanged)} unchanged"
+            )
+            assert (
+                len(delta.added) == len(delta.changed) == len(delta.removed) == 0
+            ), f"re-mapping the unchanged file {infile} reports changes {run}"
+            assert len(read_sites(outfile)) == len(sites)
+            if run == "with fingerprints":
+                # no record is mapped again
+                assert delta.fingerprints == read_fingerprints(
+                    get_fingerprint_file(previous)
+                ), "the fingerprints of the unchanged records have changed"
+            previous = outfile
+            save_new_trusted_link(trust_file)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1], "--dup-record-id" in sys.argv[2:])
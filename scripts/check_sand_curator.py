@@ -0,0 +1,110 @@
+"""Exercise SandCurator against a local stub SAND server (an httpx.MockTransport).
+
+Usage: python scripts/check_sand_curator.py
+
+The stub rejects uploads larger than its MAX_CONTENT_LENGTH with 413 like SAND does, so the check fails
+if the tables are not split into several upload requests.
+"""
+
+from __future__ import annotations
+
+import re
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import orjson
+import pandas as pd
+from libactor.cache import IdentObj
+from sm.inputs.prelude import ColumnBasedTable
+from sm.outputs.semantic_model import SemanticModel
+from tum.integrations.sand._curator import SandCurator
+
+MAX_CONTENT_LENGTH = 32 * 1024
+
+
+class StubSand:
+    def __init__(self):
+        self.tables: dict[str, int] = {}
+        self.sms: dict[int, dict] = {}
+        self.requests = Counter()
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.requests[(request.method, re.sub(r"\d+", "{id}", path))] += 1
+
+        if request.method == "GET" and path == "/api/project":
+            return items([{"id": 1}])
+        if request.method == "GET" and path == "/api/table":
+            name = request.url.params["name"]
+            return items([{"id": self.tables[name]}] if name in self.tables else [])
+        if request.method == "POST" and path == "/api/project/1/upload":
+            content = request.read()
+            if len(content) > MAX_CONTENT_LENGTH:
+                return httpx.Response(413, text="Request Entity Too Large")
+            table_ids = []
+            for name in re.findall(rb'name="([^"]+)"; filename=', content):
+                self.tables[name.decode()] = len(self.tables) + 1
+                table_ids.append(self.tables[name.decode()])
+            return httpx.Response(200, json={"table_ids": table_ids})
+        if request.method == "GET" and path == "/api/semanticmodel":
+            table_id = int(request.url.params["table"])
+            return items([self.sms[table_id]] if table_id in self.sms else [])
+        if request.method == "POST" and path == "/api/semanticmodel":
+            record = orjson.loads(request.read())
+            self.sms[record["table"]] = record
+            return httpx.Response(200, json={"id": record["table"]})
+        return httpx.Response(404, text=f"Not found: {request.method} {path}")
+
+
+def items(lst: list[dict]) -> httpx.Response:
+    return httpx.Response(200, json={"items": lst, "total": len(lst)})
+
+
+def make_table(i: int) -> IdentObj[ColumnBasedTable]:
+    # each table is ~12KB in CSV, so at most 2 tables fit in an upload of the curator below, and
+    # all of them in one request exceed the MAX_CONTENT_LENGTH of the stub
+    df = pd.DataFrame({"name": [f"site {i}-{j:04d}" for j in range(1000)]})
+    table = ColumnBasedTable.from_dataframe(df, table_id=f"table-{i}")
+    return IdentObj(key=f"table-{i}", value=table)
+
+
+def main():
+    stub = StubSand()
+    tables = [make_table(i) for i in range(5)]
+    sms = [IdentObj(key=f"sm-{i}", value=SemanticModel()) for i in range(5)]
+
+    with (
+        tempfile.TemporaryDirectory() as tmpdir,
+        SandCurator(
+            "http://sand.test",
+            Path(tmpdir),
+            max_upload_size=30 * 1024,
+            transport=httpx.MockTransport(stub.handle),
+        ) as curator,
+    ):
+        curated_sms = curator.curate_many(tables, sms)
+        assert len(curated_sms) == len(tables)
+        assert len(stub.tables) == len(tables), stub.tables
+        n_uploads = stub.requests[("POST", "/api/project/{id}/upload")]
+        assert n_uploads == 3, f"expect 3 upload requests, get {n_uploads}"
+        assert stub.requests[("POST", "/api/semanticmodel")] == len(tables)
+
+        # everything exists in SAND now, so nothing is uploaded or created again
+        curator.curate_many(tables, sms)
+        assert stub.requests[("POST", "/api/project/{id}/upload")] == n_uploads
+        assert stub.requests[("POST", "/api/semanticmodel")] == len(tables)
+
+        # the semantic models curated in SAND are written to one file per table
+        for record in stub.sms.values():
+            record["version"] = 1
+        curator.curate_many(tables, sms)
+        description_files = list(Path(tmpdir).glob("description.*.yml"))
+        assert len(description_files) == len(tables), description_files
+
+    print("SandCurator works with the stub SAND server:", dict(stub.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Check that the trust store does not lose records when a writer crashed in the middle of a record.
+
+Usage: python scripts/check_trust_store.py
+"""
+
+from __future__ import annotations
+
+import tempfile
+from pathlib import Path
+
+import orjson
+from tum.lib.trust_store import TrustStore
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = TrustStore(Path(tmpdir) / "links.json")
+        store.append([{"value": "a", "unit": "1"}, {"value": "b", "unit": "2"}])
+
+        # a process crashed while appending a record
+        with open(store.journal_file, "ab") as f:
+            f.write(orjson.dumps({"value": "c", "unit": "3"})[:10])
+        assert store.load().keys() == {"a", "b"}
+
+        # the next record is not glued to the partial line
+        store.append([{"value": "d", "unit": "4"}])
+        assert store.load() == {
+            "a": {"value": "a", "unit": "1"},
+            "b": {"value": "b", "unit": "2"},
+            "d": {"value": "d", "unit": "4"},
+        }
+        assert store.journal_file.read_bytes().endswith(b"\n")
+
+        # a partial first record
+        store.compact()
+        with open(store.journal_file, "ab") as f:
+            f.write(b'{"value": "e"')
+        store.append([{"value": "f", "unit": "6"}])
+        assert store.load().keys() == {"a", "b", "d", "f"}
+        assert len(store.journal_file.read_bytes().splitlines()) == 1
+
+    print("The trust store keeps the records appended after a partial record")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Stress the trusted unit & commodity linker with many threads saving new links concurrently.
+
+Usage: python scripts/check_trusted_linker_threads.py [entity_dir] [n_threads]
+
+The threads link overlapping texts with `link(..., save_link=True)` against an empty trust file. The check
+fails if a text gets different results in different threads, or if the trust file does not contain each
+new link exactly once.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import orjson
+from tum.lib.trust_store import TrustStore
+from tum.lib.unit_and_commodity import UnitAndCommodityTrustedLinker
+from tum.map_mos import PREDEFINED_ENTITY_DIR
+
+
+def main(entity_dir: Path, n_threads: int):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        trust_file = Path(tmpdir) / "units_and_commodities.json"
+        linker = UnitAndCommodityTrustedLinker(entity_dir, trust_file)
+
+        units = [label for doc in linker.unit_linker.docs for label in doc.labels][:20]
+        commodities = [
+            label for doc in linker.commodity_linker.docs for label in doc.labels
+        ][:20]
+        texts = [f"{unit} {commodity}" for unit in units for commodity in commodities]
+
+        def link_all(seed: int) -> dict[str, int]:
+            # each thread links all texts in a different order, so the threads race on the same texts
+            shuffled_texts = list(texts)
+            random.Random(seed).shuffle(shuffled_texts)
+            return {
+                text: id(linker.link(text, must_be_in_trusted=False, save_link=True))
+                for text in shuffled_texts
+            }
+
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            results = list(executor.map(link_all, range(n_threads * 4)))
+
+        for text in texts:
+            assert (
+                len({result[text] for result in results}) == 1
+            ), f"{text} gets different results in different threads"
+
+        with open(linker.journal_file, "rb") as f:
+            saved_texts = [orjson.loads(line)["value"] for line in f]
+        assert sorted(saved_texts) == sorted(
+            set(texts)
+        ), "each new link must be saved exactly once"
+
+        linker.save_trust_file()
+        assert set(TrustStore(trust_file).load().keys()) == set(texts)
+        assert set(
+            UnitAndCommodityTrustedLinker(entity_dir, trust_file).text2linking_result
+        ) == set(texts)
+
+    print(
+        f"{n_threads} threads saved {len(set(texts))} links to the trust file consistently"
+    )
+
+
+if __name__ == "__main__":
+    main(
+        Path(sys.argv[1]) if len(sys.argv) > 1 else PREDEFINED_ENTITY_DIR,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 32,
+    )
@@ -1,15 +1,16 @@
 from __future__ import annotations
 
+import importlib.util
 import re
+import tempfile
 from dataclasses import dataclass, field
-from pathlib import Path
 from pathlib import Path as PathlibPath
-from typing import Annotated, Callable, Mapping
+from typing import Annotated, Callable, Mapping, Optional
 
 from kgdata.models import Ontology
 from libactor.actor import Actor
 from libactor.cache import BackendFactory, IdentObj, cache
-from rdflib import XSD
+from rdflib import XSD, Graph
 from slugify import slugify
 from sm.inputs.table import ColumnBasedTable
 from sm.outputs.semantic_model import (
@@ -34,12 +35,18 @@ from drepr.models.prelude import (
     PMap,
     Preprocessing,
     PreprocessingType,
+    PreprocessResourceOutput,
     RangeAlignment,
     RangeExpr,
     Resource,
+    ResourceData,
     ResourceDataString,
     ResourceType,
 )
+from drepr.planning.class_map_plan import ClassesMapExecutionPlan
+from drepr.program_generation.main import MemoryOutput, gen_program
+from drepr.writers.rdflib_writer import RDFGraphWriter
+from drepr.writers.turtle_writer import TurtleWriter
 
 
 @dataclass
@@ -66,25 +73,28 @@ class DReprActor(Actor[DReprArgs]):
             # no column, no data
             return ""
 
+        content = convert(
+            repr=drepr,
+            resources=self.get_resources(table, sm),
+            format=self.params.output_format,
+        )
+        assert isinstance(content, str)
+        return content
+
+    def get_resources(
+        self, table: IdentObj[ColumnBasedTable], sm: IdentObj[SemanticModel]
+    ) -> dict[str, ResourceData]:
         ent_columns = {
             node.col_index
             for node in get_entity_data_nodes(sm.value, self.params.ident_props)
         }
-        resources = {
+        return {
             "table": ResourceDataString(table.value.df.to_csv(index=False)),
             # "entity": get_entity_resource(
             #     self.appcfg, self.namespace, table, rows, ent_columns
             # ),
         }
 
-        content = convert(
-            repr=drepr,
-            resources=resources,
-            format=self.params.output_format,
-        )
-        assert isinstance(content, str)
-        return content
-
     @cache(
         backend=BackendFactory.actor.sqlite.pickle(mem_persist=True),
     )
@@ -216,6 +226,83 @@ class DReprActor(Actor[DReprArgs]):
         )
 
 
+class DReprGraphActor(DReprActor):
+    """Same as DReprActor but returns the data as an in-memory RDF graph, so the downstream
+    actors (e.g., mos_map) do not need to parse the serialized data again. The output format of the
+    arguments is ignored."""
+
+    VERSION = 100
+
+    def forward(
+        self,
+        table: IdentObj[ColumnBasedTable],
+        sm: IdentObj[SemanticModel],
+        ontology: IdentObj[Ontology],
+    ) -> Graph:
+        drepr = self.make_drepr_model(table, sm, ontology)
+        if len(table.value.columns) == 0:
+            # no column, no data
+            return Graph()
+
+        return convert_to_graph(drepr, self.get_resources(table, sm))
+
+
+class GraphWriter(RDFGraphWriter):
+    """Writer of drepr programs that returns the RDF graph instead of serializing it"""
+
+    def write_to_string(self):
+        return self.g
+
+
+def convert_to_graph(
+    repr: DRepr,
+    resources: Mapping[str, ResourceData],
+    tmpdir: Optional[PathlibPath] = None,
+) -> Graph:
+    """Similar to drepr.main.convert but the generated program writes the data into an RDF graph
+    (see GraphWriter) instead of a turtle string.
+
+    Args:
+        repr: the drepr model
+        resources: the data of the resources of the model
+        tmpdir: directory to create the temporary directory of the generated program in, default to
+            the system's temporary directory
+    """
+    exec_plan = ClassesMapExecutionPlan.create(repr)
+    prog = gen_program(
+        exec_plan.desc, exec_plan, MemoryOutput(OutputFormat.TTL), False
+    ).to_python()
+
+    with tempfile.TemporaryDirectory(prefix="drepr_", dir=tmpdir) as progdir:
+        progfile = PathlibPath(progdir) / "main.py"
+        progfile.write_text(prog)
+        spec = importlib.util.spec_from_file_location("drepr_prog", progfile)
+        assert spec is not None and spec.loader is not None
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+    # drepr only generates programs writing turtle, so we swap the writer class that the program
+    # looks up from its module when it runs
+    if getattr(module, "TurtleWriter", None) is not TurtleWriter:
+        raise RuntimeError(
+            "The program generated by drepr does not use drepr.writers.turtle_writer.TurtleWriter, "
+            "the writer cannot be replaced to output an RDF graph"
+        )
+    module.TurtleWriter = GraphWriter
+    g = module.main(
+        *[
+            resources[r.id]
+            for r in exec_plan.desc.resources
+            if not isinstance(r, PreprocessResourceOutput)
+        ]
+    )
+    if not isinstance(g, Graph):
+        raise RuntimeError(
+            f"The program generated by drepr returns {type(g)} instead of an RDF graph"
+        )
+    return g
+
+
 def get_drepr_sm(
     sm: SemanticModel,
     ontology: Ontology,
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import uuid
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+
+import orjson
+from kgdata.models import Ontology
+from libactor.actor import Actor
+from libactor.cache import IdentObj
+from loguru import logger
+from sm.inputs.table import ColumnBasedTable
+from sm.outputs.semantic_model import SemanticModel
+from tum.actors.drepr import DReprActor, DReprGraphActor
+from tum.actors.mos import mos_map
+from tum.map_mos import MOS_MAPPING_VERSION, MosMapping
+
+EXPORT_FILES = ["data.ttl", "data.json"]
+
+
+@dataclass
+class ExportArgs:
+    outdir: Path
+    write_ttl: bool = True
+    write_json: bool = True
+    # maximum size (in bytes) of the cached exports, the least recently used ones are evicted first
+    cache_size: int = 1024 * 1024 * 1024
+
+
+class ExportActor(Actor[ExportArgs]):
+    """Run the whole export stage (drepr conversion, writing the turtle file, and MOS mapping) of a
+    (table, semantic model) pair, and cache the exported files by the keys of the pair so that
+    unchanged pairs are copied from the cache instead of being exported again.
+
+    The drepr conversion is done by the dependent actor, which can be either DReprActor or DReprGraphActor.
+    """
+
+    VERSION = 100
+
+    def __init__(
+        self, params: ExportArgs, dep_actors: list[DReprActor | DReprGraphActor]
+    ):
+        super().__init__(params, dep_actors)
+        assert len(dep_actors) == 1 and isinstance(dep_actors[0], DReprActor)
+        self.drepr_actor = dep_actors[0]
+
+    @cached_property
+    def cache(self) -> ExportCache:
+        return ExportCache(self.actor_dir / "exports", self.params.cache_size)
+
+    def forward(
+        self,
+        table: IdentObj[ColumnBasedTable],
+        sm: IdentObj[SemanticModel],
+        ontology: IdentObj[Ontology],
+    ) -> None:
+        files = [
+            file
+            for file, enable in zip(
+                EXPORT_FILES, [self.params.write_ttl, self.params.write_json]
+            )
+            if enable
+        ]
+        key = self.cache.make_key(
+            [
+                table.key,
+                sm.key,
+                ontology.key,
+                f"{self.drepr_actor.__class__.__name__}:{self.drepr_actor.VERSION}",
+                ",".join(files),
+            ]
+            + (
+                # data.json depends on the mapping and the entities/trusted links of its linkers
+                [
+                    f"mos:{MOS_MAPPING_VERSION}",
+                    MosMapping.get_predefined_linkers_version(),
+                ]
+                if self.params.write_json
+                else []
+            )
+        )
+        if self.cache.get(key, self.params.outdir, files):
+            return
+
+        with self.cache.put(key) as tmpdir:
+            data = self.drepr_actor.forward(table, sm, ontology)
+            if self.params.write_ttl:
+                if isinstance(data, str):
+                    (tmpdir / "data.ttl").write_text(data, encoding="utf-8")
+                else:
+                    data.serialize(
+                        tmpdir / "data.ttl", format="turtle", encoding="utf-8"
+                    )
+            if self.params.write_json:
+                mos_map(data, tmpdir)
+
+            self.params.outdir.mkdir(parents=True, exist_ok=True)
+            for file in files:
+                shutil.copyfile(tmpdir / file, self.params.outdir / file)
+
+
+class ExportCache:
+    """Content-addressed cache of exported files, bounded by the total size of the files.
+
+    Each entry is a directory named by its key, and its modification time is updated whenever it
+    is used so the least recently used entries can be evicted when the cache is full.
+    """
+
+    def __init__(self, cachedir: Path, max_size: int):
+        self.cachedir = cachedir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+
+    def make_key(self, parts: list[str]) -> str:
+        return hashlib.sha256(orjson.dumps(parts)).hexdigest()[:32]
+
+    def get(self, key: str, outdir: Path, files: list[str]) -> bool:
+        """Copy the cached files of the entry to outdir, return False if the entry is not in the cache"""
+        entrydir = self.cachedir / key
+        # an entry without files is never stored, so it is a miss
+        if len(files) == 0 or not all((entrydir / file).exists() for file in files):
+            self.misses += 1
+            return False
+
+        outdir.mkdir(parents=True, exist_ok=True)
+        for file in files:
+            shutil.copyfile(entrydir / file, outdir / file)
+        try:
+            os.utime(entrydir)
+        except FileNotFoundError:
+            # evicted by another process in the meantime, the files have been copied anyway
+            pass
+
+        self.hits += 1
+        logger.debug("Export cache hit: {} (hit rate: {:.2%})", key, self.hit_rate())
+        return True
+
+    def put(self, key: str):
+        """Return a context manager giving a temporary directory to write the files of the entry,
+        the directory is moved into the cache when the block exits without errors"""
+        return _CacheEntryWriter(self, key)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "size": sum(size for _, _, size in self.list_entries()),
+            "max_size": self.max_size,
+        }
+
+    def list_entries(self) -> list[tuple[Path, float, int]]:
+        """List (directory, last used time, size) of the cached entries"""
+        entries = []
+        for entrydir in self.cachedir.iterdir():
+            if not entrydir.is_dir() or entrydir.name.startswith("."):
+                continue
+            try:
+                size = sum(file.stat().st_size for file in entrydir.iterdir())
+                entries.append((entrydir, entrydir.stat().st_mtime, size))
+            except FileNotFoundError:
+                # evicted by another process
+                continue
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in the maximum size"""
+        entries = sorted(self.list_entries(), key=lambda x: x[1])
+        total_size = sum(size for _, _, size in entries)
+        for entrydir, _, size in entries:
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entrydir, ignore_errors=True)
+            total_size -= size
+            logger.debug("Evict export cache entry: {}", entrydir.name)
+
+
+class _CacheEntryWriter:
+    def __init__(self, cache: ExportCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.tmpdir = cache.cachedir / f".tmp_{key}_{uuid.uuid4().hex}"
+
+    def __enter__(self) -> Path:
+        self.tmpdir.mkdir(parents=True)
+        return self.tmpdir
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+            return False
+
+        entrydir = self.cache.cachedir / self.key
+        shutil.rmtree(entrydir, ignore_errors=True)
+        try:
+            os.rename(self.tmpdir, entrydir)
+        except OSError:
+            # another process has written the same entry
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+        self.cache.evict()
+        return False
@@ -2,18 +2,26 @@ from __future__ import annotations
 
 from pathlib import Path
 
-import serde.json
 from rdflib import Graph
-from tum.map_mos import MosMapping
+from tum.map_mos import MosMapping, OutputFormat, write_sites
 
 
-def mos_map(data: str | Path, outdir: Path) -> None:
-    g = Graph()
-    if isinstance(data, str):
+def mos_map(
+    data: str | Path | Graph, outdir: Path, format: OutputFormat = OutputFormat.json
+) -> None:
+    if isinstance(data, Graph):
+        # the graph is produced in memory by the upstream actor (e.g., DReprGraphActor)
+        g = data
+    elif isinstance(data, str):
+        g = Graph()
         g.parse(data=data, format="turtle")
     else:
         assert isinstance(data, Path)
+        g = Graph()
         g.parse(location=str(data), format="turtle")
 
-    output = MosMapping(g, "https://minmod.isi.edu/users/s/usc")(dup_record_ids=True)
-    serde.json.ser(output, outdir / "data.json", indent=2)
+    # the compact and ndjson formats are streamed site by site
+    sites = MosMapping(g, "https://minmod.isi.edu/users/s/usc").iter_sites(
+        dup_record_ids=True
+    )
+    write_sites(sites, outdir / ("data" + format.ext), format)
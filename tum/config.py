@@ -30,6 +30,14 @@ KG_ETL_FILE = Path(
 
 KG_OUTDIR = Path(os.environ.get("KG_OUTDIR", str(CRITICAL_MAAS_DIR / "kgdata")))
 
+# prebuilt index of the entity linkers (see tum.lib.linker_index)
+LINKER_INDEX_FILE = Path(
+    os.environ.get("LINKER_INDEX_FILE", str(DATA_DIR / "minmod/linker_index.json"))
+)
+
+# cache of the TTL files fetched from URLs (see tum.lib.http_cache)
+HTTP_CACHE_DIR = Path(os.environ.get("HTTP_CACHE_DIR", str(DATA_DIR / "cache/http")))
+
 # for azure access
 AZURE_DOC_INTEL_ENDPOINT = os.environ.get("AZURE_DOC_INTEL_ENDPOINT")
 AZURE_ACCESS_KEY = os.environ.get("AZURE_ACCESS_KEY")
@@ -2,72 +2,144 @@ from __future__ import annotations
 
 import base64
 import hashlib
+import importlib
+import multiprocessing
 import os
+import pickle
 import shutil
-from dataclasses import asdict
-from functools import partial
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Optional, Sequence
-
-import httpx
-import orjson
-import sm.outputs as O
-from drepr.main import OutputFormat
-from duneflow.ops.curation import SemanticModelCuratorActor, SemanticModelCuratorArgs
-from duneflow.ops.formatter import to_column_based_table
-from duneflow.ops.matrix_to_relational import matrix_to_relational_table
-from duneflow.ops.matrix_to_relational_v2 import matrix_to_relational_table_v2
-from duneflow.ops.norm import NormTableActor, NormTableArgs, norm_column_based_table
-from duneflow.ops.reader import read_table_from_file
-from duneflow.ops.reader._table_file_reader import RawTable
-from duneflow.ops.select import table_range_select
-from duneflow.ops.writer import write_table_to_file
-from gp.actors.data import KGDB, GPExample, KGDBArgs
-from gpp.actors.gpp_sem_label_actor import GppSemLabelActor, GppSemLabelArgs
-from gpp.actors.gpp_sem_model_actor import GppSemModelActor, GppSemModelArgs
-from gpp.actors.graph_space_actor import (
-    GraphSpaceV1Actor,
-    GraphSpaceV1Args,
-    PConnection,
-)
-from gpp.llm.qa_llm import Schema
-from kgdata.models import Ontology
-from libactor.cache import IdentObj
-from libactor.dag import DAG, Flow, PartialFn
-from libactor.dag._dag import ComputeFn
-from libactor.storage import GlobalStorage
+from typing import TYPE_CHECKING, Any, Optional, Sequence
+
 from libactor.typing import T
-from slugify import slugify
-from sm.dataset import Example, FullTable
-from sm.inputs.prelude import ColumnBasedTable, Context
-from sm.misc.prelude import Matrix, get_classpath
-from sm.namespaces.prelude import KGName, register_kgns
-from sm.outputs.semantic_model import SemanticModel
 from timer import Timer
-from tum.actors.drepr import DReprActor, DReprArgs
-from tum.actors.mos import mos_map
 from tum.config import CRITICAL_MAAS_DIR, PROJECT_DIR
-from tum.db import MNDRDB
-from tum.namespace import MNDRNamespace
-from tum.preprocessing.extract_table import extract_table_from_pdf
-
-
-class FixMNDRNamespace(MNDRNamespace):
-    def id_to_uri(self, id: str) -> str:
-        return str(id)
-
-    def uri_to_id(self, uri: str) -> str:
-        return str(uri)
-
 
-kgns = FixMNDRNamespace.create()
-register_kgns(KGName.Generic, kgns)
+if TYPE_CHECKING:
+    from duneflow.ops.reader._table_file_reader import RawTable
+    from gp.actors.data import GPExample
+    from libactor.cache import IdentObj
+    from libactor.dag import DAG, Flow
+    from libactor.dag._dag import ComputeFn
+    from rdflib import Graph
+    from sm.inputs.prelude import ColumnBasedTable
+    from sm.outputs.semantic_model import SemanticModel
+    from tum.integrations.sand._curator import SandCurator
+    from tum.lib.instrument import DAGInstrument, NodeMeasurement
+    from tum.namespace import FixMNDRNamespace
+
+# heavy dependencies are imported when they are first used (see `__getattr__`) to keep
+# the import of this module cheap for short-lived processes (CLIs, SAND workers)
+_LAZY_IMPORTS: dict[str, str] = {
+    "O": "sm.outputs",
+    "OutputFormat": "drepr.main:OutputFormat",
+    "SemanticModelCuratorActor": "duneflow.ops.curation:SemanticModelCuratorActor",
+    "SemanticModelCuratorArgs": "duneflow.ops.curation:SemanticModelCuratorArgs",
+    "to_column_based_table": "duneflow.ops.formatter:to_column_based_table",
+    "matrix_to_relational_table": "duneflow.ops.matrix_to_relational:matrix_to_relational_table",
+    "matrix_to_relational_table_v2": "duneflow.ops.matrix_to_relational_v2:matrix_to_relational_table_v2",
+    "NormTableActor": "duneflow.ops.norm:NormTableActor",
+    "NormTableArgs": "duneflow.ops.norm:NormTableArgs",
+    "norm_column_based_table": "duneflow.ops.norm:norm_column_based_table",
+    "read_table_from_file": "duneflow.ops.reader:read_table_from_file",
+    "RawTable": "duneflow.ops.reader._table_file_reader:RawTable",
+    "table_range_select": "duneflow.ops.select:table_range_select",
+    "write_table_to_file": "duneflow.ops.writer:write_table_to_file",
+    "KGDB": "gp.actors.data:KGDB",
+    "GPExample": "gp.actors.data:GPExample",
+    "KGDBArgs": "gp.actors.data:KGDBArgs",
+    "GppSemLabelActor": "gpp.actors.gpp_sem_label_actor:GppSemLabelActor",
+    "GppSemLabelArgs": "gpp.actors.gpp_sem_label_actor:GppSemLabelArgs",
+    "GppSemModelActor": "gpp.actors.gpp_sem_model_actor:GppSemModelActor",
+    "GppSemModelArgs": "gpp.actors.gpp_sem_model_actor:GppSemModelArgs",
+    "GraphSpaceV1Actor": "gpp.actors.graph_space_actor:GraphSpaceV1Actor",
+    "GraphSpaceV1Args": "gpp.actors.graph_space_actor:GraphSpaceV1Args",
+    "PConnection": "gpp.actors.graph_space_actor:PConnection",
+    "Schema": "gpp.llm.qa_llm:Schema",
+    "Ontology": "kgdata.models:Ontology",
+    "IdentObj": "libactor.cache:IdentObj",
+    "DAG": "libactor.dag:DAG",
+    "Flow": "libactor.dag:Flow",
+    "PartialFn": "libactor.dag:PartialFn",
+    "ComputeFn": "libactor.dag._dag:ComputeFn",
+    "GlobalStorage": "libactor.storage:GlobalStorage",
+    "Graph": "rdflib:Graph",
+    "slugify": "slugify:slugify",
+    "Example": "sm.dataset:Example",
+    "FullTable": "sm.dataset:FullTable",
+    "ColumnBasedTable": "sm.inputs.prelude:ColumnBasedTable",
+    "Context": "sm.inputs.prelude:Context",
+    "Matrix": "sm.misc.prelude:Matrix",
+    "get_classpath": "sm.misc.prelude:get_classpath",
+    "KGName": "sm.namespaces.prelude:KGName",
+    "SemanticModel": "sm.outputs.semantic_model:SemanticModel",
+    "DReprActor": "tum.actors.drepr:DReprActor",
+    "DReprGraphActor": "tum.actors.drepr:DReprGraphActor",
+    "DReprArgs": "tum.actors.drepr:DReprArgs",
+    "mos_map": "tum.actors.mos:mos_map",
+    "MNDRDB": "tum.db:MNDRDB",
+    "MNDRNamespace": "tum.namespace:MNDRNamespace",
+    "FixMNDRNamespace": "tum.namespace:FixMNDRNamespace",
+    "extract_table_from_pdf": "tum.preprocessing.extract_table:extract_table_from_pdf",
+}
+
+# names used in the type annotations of the compute functions & type conversions of the DAG,
+# they must be bound to the module before libactor resolves the annotations with `get_type_hints`
+_DAG_ANNOTATION_NAMES = [
+    "IdentObj",
+    "RawTable",
+    "GPExample",
+    "Example",
+    "FullTable",
+    "ColumnBasedTable",
+    "Context",
+    "Matrix",
+    "SemanticModel",
+    "Graph",
+]
+
+
+def __getattr__(name: str):
+    if name == "kgns":
+        return get_kgns()
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module, _, attr = _LAZY_IMPORTS[name].partition(":")
+    value = importlib.import_module(module)
+    if attr != "":
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
+
+
+def _bind_lazy_imports(names: Sequence[str]):
+    for name in names:
+        if name not in globals():
+            __getattr__(name)
+
+
+@lru_cache(maxsize=None)
+def get_kgns() -> FixMNDRNamespace:
+    """Get the namespace of the generic KG, registering it on the first call"""
+    from sm.namespaces.prelude import KGName, register_kgns
+    from tum.namespace import FixMNDRNamespace
+
+    kgns = FixMNDRNamespace.create()
+    register_kgns(KGName.Generic, kgns)
+    return kgns
 
 
 def get_ontology():
+    from kgdata.models import Ontology
+    from sm.namespaces.prelude import KGName
+
     return Ontology.from_ttl(
         KGName.Generic,
-        kgns,
+        get_kgns(),
         Path(__file__).parent.parent / "schema/mos.ttl",
     )[0]
 
@@ -84,73 +156,163 @@ def write_ttl(text: str, outdir: Path) -> str:
     return text
 
 
+def write_graph_ttl(g: Graph, outdir: Path) -> Graph:
+    """Write an RDF graph to a turtle file"""
+    g.serialize(os.path.join(outdir, "data.ttl"), format="turtle", encoding="utf-8")
+    return g
+
+
 def always_fail(input: T) -> T:
     raise Exception("Stopping here")
 
 
+# bump this version when the content of the context changes to invalidate existing snapshots
+CONTEXT_SNAPSHOT_VERSION = 101
+
+
 def get_context(
     cwd: Path,
     dbpath: Path = CRITICAL_MAAS_DIR / "data/minmod/databases",
     ontology_file: Path = PROJECT_DIR / "schema/mos.ttl",
+    use_snapshot: bool = True,
 ):
+    """Return context for the DAG.
+
+    Building the context (parsing the ontology, creating the schema & graph space) is slow, so the
+    result is stored as a pickle snapshot in the storage directory, keyed by the content of the ontology
+    file and the database path. The snapshot is invalidated automatically when either of them changes.
+    """
+    from libactor.storage import GlobalStorage
+    from loguru import logger
+
     GlobalStorage.init(cwd / "storage")
 
-    """Return context for the DAG"""
     with Timer().watch_and_report("get context"):
-        ontology, entities = Ontology.from_ttl(
-            KGName.Generic,
-            kgns,
-            ontology_file,
-        )
-        ontkey = ontology_file.stem
-        schema = Schema.from_ontology(ontology)
-        context = {
-            "ontology": IdentObj(ontkey, ontology),
-            "schema": IdentObj(ontkey, schema),
-            "kgns": ontology.kgns,
-            "entity_columns": None,
-        }
-
-        pconns: list[PConnection] = []
-        for pid in schema.props:
-            prop = ontology.props[pid]
-            assert len(prop.domains) == 1, prop.id
-            pconns.append(
-                PConnection(
-                    prop=prop.id,
-                    qual=None,
-                    source_type=prop.domains[0],
-                    target_type=prop.ranges[0] if len(prop.ranges) > 0 else None,
-                    freq=1,
+        if not use_snapshot:
+            return build_context(dbpath, ontology_file)
+
+        snapshot_file = get_context_snapshot_file(cwd, dbpath, ontology_file)
+        if snapshot_file.exists():
+            try:
+                with open(snapshot_file, "rb") as f:
+                    context = pickle.load(f)
+                # the namespace is registered when the context is built, not when it is unpickled
+                get_kgns()
+                return context
+            except Exception:
+                logger.exception(
+                    "Cannot load the context snapshot {}. Rebuilding it.",
+                    snapshot_file,
                 )
-            )
 
-        context["graph_space"] = GraphSpaceV1Actor(
-            GraphSpaceV1Args(
-                top_k_data_props=5,
-                top_k_object_props=5,
+        context = build_context(dbpath, ontology_file)
+
+        # remove outdated snapshots of the same ontology and database before saving the new one
+        prefix = snapshot_file.name.rsplit("_", 1)[0]
+        for file in snapshot_file.parent.glob(f"{prefix}_*.pkl"):
+            file.unlink()
+        tmp_file = snapshot_file.with_suffix(f".tmp.{os.getpid()}")
+        try:
+            with open(tmp_file, "wb") as f:
+                pickle.dump(context, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, snapshot_file)
+        except Exception:
+            logger.exception("Cannot save the context snapshot {}", snapshot_file)
+            tmp_file.unlink(missing_ok=True)
+    return context
+
+
+def get_context_snapshot_file(cwd: Path, dbpath: Path, ontology_file: Path) -> Path:
+    """Get the snapshot file of the context built from the given ontology file and database.
+
+    The file is named `<ontology>_<database hash>_<content hash>.pkl`, so the outdated snapshots of a
+    database can be removed without touching the snapshots of other databases.
+    """
+    dbhash = hashlib.sha256(str(Path(dbpath).absolute()).encode()).hexdigest()[:16]
+    hasher = hashlib.sha256(ontology_file.read_bytes())
+    hasher.update(str(CONTEXT_SNAPSHOT_VERSION).encode())
+
+    snapshot_dir = cwd / "storage" / "context"
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    return snapshot_dir / f"{ontology_file.stem}_{dbhash}_{hasher.hexdigest()[:16]}.pkl"
+
+
+def build_context(dbpath: Path, ontology_file: Path) -> dict:
+    """Build the context for the DAG from scratch"""
+    from gp.actors.data import KGDB, KGDBArgs
+    from gpp.actors.graph_space_actor import (
+        GraphSpaceV1Actor,
+        GraphSpaceV1Args,
+        PConnection,
+    )
+    from gpp.llm.qa_llm import Schema
+    from kgdata.models import Ontology
+    from libactor.cache import IdentObj
+    from sm.misc.prelude import get_classpath
+    from sm.namespaces.prelude import KGName
+    from tum.db import MNDRDB
+
+    ontology, entities = Ontology.from_ttl(
+        KGName.Generic,
+        get_kgns(),
+        ontology_file,
+    )
+    ontkey = ontology_file.stem
+    schema = Schema.from_ontology(ontology)
+    context = {
+        "ontology": IdentObj(ontkey, ontology),
+        "schema": IdentObj(ontkey, schema),
+        "kgns": ontology.kgns,
+        "entity_columns": None,
+    }
+
+    pconns: list[PConnection] = []
+    for pid in schema.props:
+        prop = ontology.props[pid]
+        assert len(prop.domains) == 1, prop.id
+        pconns.append(
+            PConnection(
+                prop=prop.id,
+                qual=None,
+                source_type=prop.domains[0],
+                target_type=prop.ranges[0] if len(prop.ranges) > 0 else None,
+                freq=1,
             )
-        ).forward(
-            None,
-            context["schema"],
-            context["ontology"],
-            IdentObj(ontkey, pconns),
         )
 
-        kgdb = KGDB(
-            KGDBArgs(
-                name=KGName.Generic,
-                version="20250311",
-                datadir=dbpath,
-                clspath=get_classpath(MNDRDB),
-            )
+    context["graph_space"] = GraphSpaceV1Actor(
+        GraphSpaceV1Args(
+            top_k_data_props=5,
+            top_k_object_props=5,
+        )
+    ).forward(
+        None,
+        context["schema"],
+        context["ontology"],
+        IdentObj(ontkey, pconns),
+    )
+
+    kgdb = KGDB(
+        KGDBArgs(
+            name=KGName.Generic,
+            version="20250311",
+            datadir=dbpath,
+            clspath=get_classpath(MNDRDB),
         )
-        kgdb.ontology = context["ontology"]
-        context["kgdb"] = IdentObj(kgdb.args.get_key(), kgdb)
+    )
+    kgdb.ontology = context["ontology"]
+    context["kgdb"] = IdentObj(kgdb.args.get_key(), kgdb)
     return context
 
 
 def get_type_conversions():
+    from libactor.cache import IdentObj
+    from sm.dataset import Example, FullTable
+    from sm.inputs.prelude import Context
+    from sm.misc.prelude import Matrix
+
+    _bind_lazy_imports(_DAG_ANNOTATION_NAMES)
+
     def convert_table(table: ColumnBasedTable) -> FullTable:
         return FullTable(
             table=table,
@@ -206,12 +368,43 @@ def get_dag(
     sem_model: Optional[Flow | ComputeFn] = None,
     without_sm_curation: bool = False,
     without_json_export: bool = False,
+    in_memory_export: bool = False,
+    without_ttl_export: bool = False,
+    export_cache_size: Optional[int] = None,
     sand_endpoint: Optional[str] = None,
+    sand_pooled_client: bool = False,
+    incremental: bool = False,
     extra_nodes: dict[str, Sequence[Flow | ComputeFn] | Flow | ComputeFn] = {},
+    instrument: Optional[DAGInstrument] = None,
 ):
+    from drepr.main import OutputFormat
+    from duneflow.ops.curation import (
+        SemanticModelCuratorActor,
+        SemanticModelCuratorArgs,
+    )
+    from gpp.actors.gpp_sem_label_actor import GppSemLabelActor, GppSemLabelArgs
+    from gpp.actors.gpp_sem_model_actor import GppSemModelActor, GppSemModelArgs
+    from libactor.dag import DAG, Flow, PartialFn
+    from libactor.storage import GlobalStorage
+    from tum.actors.drepr import DReprActor, DReprArgs, DReprGraphActor
+    from tum.actors.export import ExportActor, ExportArgs
+    from tum.actors.mos import mos_map
+
+    _bind_lazy_imports(_DAG_ANNOTATION_NAMES)
     GlobalStorage.init(cwd / "storage")
     output_dir = cwd / "output"
 
+    if incremental:
+        # cache the output of each step of the table pipeline to recompute only the steps
+        # downstream of a changed input file or parameter on reruns
+        from tum.lib.incremental import IncrementalPipeline
+
+        pipeline = IncrementalPipeline(cwd / "storage" / "incremental")
+        if isinstance(table, Sequence):
+            table = pipeline.wrap(table)
+        else:
+            table = pipeline.wrap([table])[0]
+
     if sem_label is None:
         sem_label = Flow(
             source="table",
@@ -246,7 +439,7 @@ def get_dag(
             Flow(
                 source=["table", ""],
                 target=PartialFn(
-                    sand_curator,
+                    pooled_sand_curator if sand_pooled_client else sand_curator,
                     sand_endpoint=sand_endpoint,
                     output_dir=output_dir,
                 ),
@@ -262,41 +455,210 @@ def get_dag(
             ),
         )
 
+    if export_cache_size is not None:
+        # the whole export stage is done by a single actor caching the exported files by the keys
+        # of the table and the semantic model, the cache is bounded by export_cache_size (bytes)
+        drepr_args = DReprArgs(output_dir, OutputFormat.TTL)
+        export_pipeline = [
+            Flow(
+                source=["table", "sem_model"],
+                target=ExportActor(
+                    ExportArgs(
+                        output_dir,
+                        write_ttl=not without_ttl_export,
+                        write_json=not without_json_export,
+                        cache_size=export_cache_size,
+                    ),
+                    [
+                        (
+                            DReprGraphActor(drepr_args)
+                            if in_memory_export
+                            else DReprActor(drepr_args)
+                        )
+                    ],
+                ),
+            )
+        ]
+    elif in_memory_export:
+        # pass the RDF graph to mos_map directly instead of serializing it to turtle and parsing it back
+        export_pipeline = [
+            Flow(
+                source=["table", "sem_model"],
+                target=DReprGraphActor(DReprArgs(output_dir, OutputFormat.TTL)),
+            )
+        ]
+        if not without_ttl_export:
+            export_pipeline.append(PartialFn(write_graph_ttl, outdir=output_dir))
+    else:
+        export_pipeline = [
+            Flow(
+                source=["table", "sem_model"],
+                target=DReprActor(DReprArgs(output_dir, OutputFormat.TTL)),
+            )
+        ]
+        if not without_ttl_export:
+            export_pipeline.append(PartialFn(write_ttl, outdir=output_dir))
+    if export_cache_size is None and not without_json_export:
+        export_pipeline.append(PartialFn(mos_map, outdir=output_dir))
+
     with Timer().watch_and_report("create dag"):
         dag = DAG.from_dictmap(
             {
                 "table": table,
                 "sem_label": sem_label,
                 "sem_model": sem_model_pipeline,
-                "export": (
-                    [
-                        Flow(
-                            source=["table", "sem_model"],
-                            target=DReprActor(DReprArgs(output_dir, OutputFormat.TTL)),
-                        ),
-                        PartialFn(write_ttl, outdir=output_dir),
-                    ]
-                    + (
-                        []
-                        if without_json_export
-                        else [PartialFn(mos_map, outdir=output_dir)]
-                    )
-                ),
+                "export": export_pipeline,
                 **extra_nodes,
             },
             type_conversions=get_type_conversions(),
         )
 
+    if instrument is not None:
+        instrument.attach(dag)
     return dag
 
 
+@dataclass
+class BatchResult:
+    """Result of running one input of a batch through the DAG"""
+
+    input: Any
+    output: Optional[dict[str, list]] = None
+    error: Optional[str] = None
+    # measurements of the DAG nodes if the batch is instrumented
+    measurements: list[NodeMeasurement] = field(default_factory=list)
+
+    def is_success(self) -> bool:
+        return self.error is None
+
+
+# DAG and context shared with the forked worker processes of `process_batch`
+_batch_state: Optional[tuple[DAG, dict, Optional[DAGInstrument]]] = None
+
+
+def process_batch(
+    dag: DAG,
+    inputs: Sequence,
+    output: set[str],
+    context: dict,
+    input_node: str = "table",
+    n_jobs: int = -1,
+    verbose: bool = True,
+    instrument: Optional[DAGInstrument] = None,
+) -> list[BatchResult]:
+    """Run many inputs (e.g., table files) through the same DAG using a pool of worker processes.
+
+    The context should be created once (e.g., via `get_context`) and is shared with the workers by forking
+    the current process, so the ontology, schema, and graph space are not rebuilt for every input.
+    Failures of an input are captured in its result instead of stopping the whole batch.
+
+    Args:
+        dag: the DAG created by `get_dag`
+        inputs: list of inputs to feed to `input_node`, one per run
+        output: the nodes of the DAG whose outputs are returned
+        context: the context of the DAG
+        input_node: the node receiving the inputs
+        n_jobs: number of worker processes, -1 to use all CPUs, 1 to run in the current process
+        verbose: whether to show the progress bar
+        instrument: the instrument attached to the DAG (see `get_dag`), measurements of each input are
+            labeled with the input and collected back from the workers
+    """
+    from tqdm.auto import tqdm
+
+    global _batch_state
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(inputs))
+
+    if n_jobs <= 1:
+        results = [
+            _process_batch_item(dag, context, inp, input_node, output, instrument)
+            for inp in tqdm(inputs, disable=not verbose, desc="process batch")
+        ]
+    else:
+        _batch_state = (dag, context, instrument)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=n_jobs, mp_context=multiprocessing.get_context("fork")
+            ) as executor:
+                futures = {
+                    executor.submit(_process_batch_worker, inp, input_node, output): i
+                    for i, inp in enumerate(inputs)
+                }
+                idx2result: dict[int, BatchResult] = {}
+                for future in tqdm(
+                    as_completed(futures),
+                    total=len(futures),
+                    disable=not verbose,
+                    desc="process batch",
+                ):
+                    i = futures[future]
+                    try:
+                        idx2result[i] = future.result()
+                    except Exception:
+                        # the worker died or the output cannot be pickled
+                        idx2result[i] = BatchResult(
+                            input=inputs[i], error=traceback.format_exc()
+                        )
+        finally:
+            _batch_state = None
+        results = [idx2result[i] for i in range(len(inputs))]
+        if instrument is not None:
+            for r in results:
+                instrument.records.extend(r.measurements)
+
+    if verbose:
+        n_errors = sum(not r.is_success() for r in results)
+        print(f"Processed {len(results)} inputs: {n_errors} failed")
+    return results
+
+
+def _process_batch_worker(inp: Any, input_node: str, output: set[str]) -> BatchResult:
+    assert _batch_state is not None, "The worker must be forked from `process_batch`"
+    dag, context, instrument = _batch_state
+    return _process_batch_item(dag, context, inp, input_node, output, instrument)
+
+
+def _process_batch_item(
+    dag: DAG,
+    context: dict,
+    inp: Any,
+    input_node: str,
+    output: set[str],
+    instrument: Optional[DAGInstrument] = None,
+) -> BatchResult:
+    if instrument is None:
+        try:
+            return BatchResult(
+                input=inp,
+                output=dag.process(
+                    input={input_node: (inp,)}, output=output, context=context
+                ),
+            )
+        except Exception:
+            return BatchResult(input=inp, error=traceback.format_exc())
+
+    with instrument.table(str(inp)) as measurements:
+        result = _process_batch_item(dag, context, inp, input_node, output)
+    result.measurements = measurements
+    return result
+
+
 def sand_curator(
     table: IdentObj[ColumnBasedTable],
     sm: IdentObj[SemanticModel],
     sand_endpoint: str,
     output_dir: Path,
 ) -> IdentObj[SemanticModel]:
+    import httpx
+    import sm.outputs as O
+    from libactor.cache import IdentObj
     from sand.client import Client
+    from tum.integrations.sand._curator import (
+        get_sand_description_file,
+        get_sand_table_name,
+    )
 
     client = Client(sand_endpoint)
 
@@ -305,7 +667,7 @@ def sand_curator(
 
     # TODO: we can warn about the conflict if we store the table key in the description
     # retrieve or create table if it doesn't exist
-    table_name = slugify(table.value.table_id) + "__" + shorten_key(table.key)
+    table_name = get_sand_table_name(table)
     if not client.tables.has({"project": project_id, "name": table_name}):
         # create table if it does not exist
         resp = httpx.post(
@@ -349,14 +711,33 @@ def sand_curator(
         O.ser_simple_tree_yaml(
             table.value,
             curated_sm,
-            kgns,
-            output_dir / f"description.yml",
+            get_kgns(),
+            get_sand_description_file(output_dir, table),
         )
     return IdentObj(key=hash_dict(resp["data"]), value=curated_sm)
 
 
+def pooled_sand_curator(
+    table: IdentObj[ColumnBasedTable],
+    sm: IdentObj[SemanticModel],
+    sand_endpoint: str,
+    output_dir: Path,
+) -> IdentObj[SemanticModel]:
+    """Same as `sand_curator` but reuses one pooled HTTP client for all tables and issues
+    the requests concurrently (see `SandCurator`)"""
+    return get_sand_curator(sand_endpoint, output_dir).curate(table, sm)
+
+
+@lru_cache(maxsize=None)
+def get_sand_curator(sand_endpoint: str, output_dir: Path) -> SandCurator:
+    from tum.integrations.sand._curator import SandCurator
+
+    return SandCurator(sand_endpoint, output_dir)
+
+
 def to_sand_sm(sm: SemanticModel) -> dict:
     """Convert a SemanticModel to a dictionary suitable for SAND."""
+    import sm.outputs as O
 
     def serialize_classnode(node: O.ClassNode) -> dict:
         return {
@@ -412,6 +793,8 @@ def to_sand_sm(sm: SemanticModel) -> dict:
 
 def from_sand_sm(obj: dict) -> SemanticModel:
     """Convert a dictionary from SAND to a SemanticModel."""
+    import sm.outputs as O
+
     nodes = []
     for node in obj["nodes"]:
         if node["type"] == "class_node":
@@ -463,7 +846,7 @@ def from_sand_sm(obj: dict) -> SemanticModel:
         for edge in obj["edges"]
     ]
 
-    return SemanticModel.from_dict({"nodes": nodes, "edges": edges})
+    return O.SemanticModel.from_dict({"nodes": nodes, "edges": edges})
 
 
 def shorten_key(key: str) -> str:
@@ -472,7 +855,7 @@ def shorten_key(key: str) -> str:
 
 
 def hash_dict(d: dict) -> str:
-    """Hash a dictionary using SHA-256 and return base64 digest."""
-    return base64.b64encode(hashlib.sha256(orjson.dumps(d)).digest()).decode("utf-8")[
-        :8
-    ]
+    """Hash a dictionary using xxhash and return the hex digest."""
+    from tum.lib.fingerprint import fingerprint_dict
+
+    return fingerprint_dict(d)
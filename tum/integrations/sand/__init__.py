@@ -1,15 +1,47 @@
-from tum.integrations.sand._db import (
-    PropDataTypeMapping,
-    WrappedEntity,
-    WrappedOntClass,
-    WrappedOntProp,
-    dummy_search,
-    get_entity_db,
-    get_ontclass_db,
-    get_ontprop_db,
-)
-from tum.integrations.sand._dsl import DSLMinModAssistant
-from tum.integrations.sand._openai import OpenAIMinModAssistant
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from tum.integrations.sand._curator import SandCurator
+    from tum.integrations.sand._db import (
+        PropDataTypeMapping,
+        WrappedEntity,
+        WrappedOntClass,
+        WrappedOntProp,
+        dummy_search,
+        get_entity_db,
+        get_ontclass_db,
+        get_ontprop_db,
+    )
+    from tum.integrations.sand._dsl import DSLMinModAssistant
+    from tum.integrations.sand._openai import OpenAIMinModAssistant
+
+# SAND loads the constructors by their classpath, so only import the submodule (and its
+# dependencies, e.g., openai) that is actually requested
+_LAZY_IMPORTS: dict[str, str] = {
+    "SandCurator": "tum.integrations.sand._curator",
+    "PropDataTypeMapping": "tum.integrations.sand._db",
+    "WrappedEntity": "tum.integrations.sand._db",
+    "WrappedOntClass": "tum.integrations.sand._db",
+    "WrappedOntProp": "tum.integrations.sand._db",
+    "dummy_search": "tum.integrations.sand._db",
+    "get_entity_db": "tum.integrations.sand._db",
+    "get_ontclass_db": "tum.integrations.sand._db",
+    "get_ontprop_db": "tum.integrations.sand._db",
+    "DSLMinModAssistant": "tum.integrations.sand._dsl",
+    "OpenAIMinModAssistant": "tum.integrations.sand._openai",
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     "PropDataTypeMapping",
@@ -22,4 +54,5 @@ __all__ = [
     "DSLMinModAssistant",
     "OpenAIMinModAssistant",
     "dummy_search",
+    "SandCurator",
 ]
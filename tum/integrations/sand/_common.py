@@ -1,14 +1,17 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from sm.prelude import I, O
-from tum.dag import IdentObj, hash_dict
-from tum.sm.llm.openai_sem_label import InputTable, OpenAILiteralPrediction
+from tum.dag import IdentObj
+from tum.lib.fingerprint import fingerprint_table
+
+if TYPE_CHECKING:
+    from tum.sm.llm.openai_sem_label import InputTable, OpenAILiteralPrediction
 
 
 def set_table(table: I.ColumnBasedTable) -> IdentObj[I.ColumnBasedTable]:
-    return IdentObj(key=hash_dict(table.to_dict()), value=table)
+    return IdentObj(key=fingerprint_table(table), value=table)
 
 
 def post_process_sm(
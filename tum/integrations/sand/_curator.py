@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from pathlib import Path
+from typing import Coroutine, Optional, Sequence, TypeVar
+
+import httpx
+import orjson
+import sm.outputs as O
+from libactor.cache import IdentObj
+from slugify import slugify
+from sm.inputs.prelude import ColumnBasedTable
+from sm.outputs.semantic_model import SemanticModel
+from tum.dag import from_sand_sm, get_kgns, hash_dict, shorten_key, to_sand_sm
+
+R = TypeVar("R")
+
+
+class SandCurator:
+    """Curate semantic models in SAND, reusing one pooled HTTP client for all tables.
+
+    The requests of a batch of tables are issued concurrently: the lookups of the tables and their
+    semantic models are pipelined, and the missing tables are uploaded in as few requests as the
+    server's request size limit allows.
+
+    The HTTP client lives in an event loop running in a background thread, so the synchronous
+    methods (`curate`, `curate_many`) can be called from the DAG. The loop is recreated if the
+    process is forked (e.g., by `process_batch`).
+
+    Args:
+        endpoint: URL of the SAND server
+        output_dir: directory to write the semantic models that have been updated in SAND, one file
+            per table (see `get_sand_description_file`)
+        project_name: the SAND project to store the tables
+        sm_name: name of the semantic model of the tables in SAND
+        max_connections: maximum number of concurrent connections to SAND
+        max_upload_size: maximum size (in bytes) of the tables uploaded in one request, below the
+            `MAX_CONTENT_LENGTH` of the SAND server (16MB) to leave room for the multipart encoding
+        timeout: timeout of each request in seconds
+        transport: custom transport of the HTTP client (e.g., to test against a stub server)
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        output_dir: Path,
+        project_name: str = "Default",
+        sm_name: str = "sm-auto-0",
+        max_connections: int = 16,
+        max_upload_size: int = 8 * 1024 * 1024,
+        timeout: float = 60.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.endpoint = endpoint
+        self.output_dir = output_dir
+        self.project_name = project_name
+        self.sm_name = sm_name
+        self.max_connections = max_connections
+        self.max_upload_size = max_upload_size
+        self.timeout = timeout
+        self.transport = transport
+
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._project_ids: dict[str, int] = {}
+
+    def curate(
+        self, table: IdentObj[ColumnBasedTable], sm: IdentObj[SemanticModel]
+    ) -> IdentObj[SemanticModel]:
+        return self.curate_many([table], [sm])[0]
+
+    def curate_many(
+        self,
+        tables: Sequence[IdentObj[ColumnBasedTable]],
+        sms: Sequence[IdentObj[SemanticModel]],
+    ) -> list[IdentObj[SemanticModel]]:
+        return self._run(self.acurate_many(tables, sms))
+
+    def close(self):
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+            if self._client is not None:
+                asyncio.run_coroutine_threadsafe(
+                    self._client.aclose(), self._loop
+                ).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            assert self._thread is not None
+            self._thread.join()
+            self._loop.close()
+            self._loop, self._thread, self._client, self._pid = None, None, None, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def acurate_many(
+        self,
+        tables: Sequence[IdentObj[ColumnBasedTable]],
+        sms: Sequence[IdentObj[SemanticModel]],
+    ) -> list[IdentObj[SemanticModel]]:
+        """Upload the tables and their semantic models to SAND if they do not exist, then download
+        the (possibly curated) semantic models."""
+        assert len(tables) == len(sms)
+        project_id = await self.aget_project_id(self.project_name)
+
+        # TODO: we can warn about the conflict if we store the table key in the description
+        # retrieve or create table if it doesn't exist
+        table_names = [get_sand_table_name(table) for table in tables]
+        table_ids = await asyncio.gather(
+            *(self.afind_table(project_id, name) for name in table_names)
+        )
+        missing_tables = {
+            name: table
+            for name, table, table_id in zip(table_names, tables, table_ids)
+            if table_id is None
+        }
+        if len(missing_tables) > 0:
+            name2id = await self.aupload_tables(project_id, missing_tables)
+            table_ids = [
+                table_id if table_id is not None else name2id[name]
+                for name, table_id in zip(table_names, table_ids)
+            ]
+
+        records = await asyncio.gather(
+            *(
+                self.aget_or_create_sm(table_id, sm)
+                for table_id, sm in zip(table_ids, sms)
+            )
+        )
+
+        curated_sms = []
+        for table, table_id, record in zip(tables, table_ids, records):
+            print(
+                "Edit the semantic model in SAND at this URL:",
+                f"{self.endpoint}/tables/{table_id}",
+            )
+            curated_sm = from_sand_sm(record["data"])
+            if record["version"] > 0:
+                # this means that the semantic model has been updated
+                O.ser_simple_tree_yaml(
+                    table.value,
+                    curated_sm,
+                    get_kgns(),
+                    get_sand_description_file(self.output_dir, table),
+                )
+            curated_sms.append(
+                IdentObj(key=hash_dict(record["data"]), value=curated_sm)
+            )
+        return curated_sms
+
+    async def aget_project_id(self, name: str) -> int:
+        """Get project id by name"""
+        if name not in self._project_ids:
+            items = await self._aget_items("project", {"name": name, "fields": "id"})
+            if len(items) != 1:
+                raise Exception(f"Project `{name}` not found")
+            self._project_ids[name] = items[0]["id"]
+        return self._project_ids[name]
+
+    async def afind_table(self, project_id: int, name: str) -> Optional[int]:
+        """Get id of a table by its name, None if the table does not exist"""
+        items = await self._aget_items(
+            "table", {"project": project_id, "name": name, "fields": "id"}
+        )
+        return items[0]["id"] if len(items) > 0 else None
+
+    async def aupload_tables(
+        self, project_id: int, tables: dict[str, IdentObj[ColumnBasedTable]]
+    ) -> dict[str, int]:
+        """Upload tables to the project, return the ids of the created tables.
+
+        The tables are grouped into requests of at most `max_upload_size` bytes (a larger table is
+        uploaded alone), and the requests are sent concurrently.
+        """
+        batches: list[dict[str, bytes]] = []
+        batch_size = 0
+        for name, table in tables.items():
+            content = table.value.df.to_csv(index=False, sep=",").encode()
+            if len(batches) == 0 or batch_size + len(content) > self.max_upload_size:
+                batches.append({})
+                batch_size = 0
+            batches[-1][name] = content
+            batch_size += len(content)
+
+        name2id = {}
+        for batch_name2id in await asyncio.gather(
+            *(self._aupload_batch(project_id, batch) for batch in batches)
+        ):
+            name2id.update(batch_name2id)
+        return name2id
+
+    async def _aupload_batch(
+        self, project_id: int, name2content: dict[str, bytes]
+    ) -> dict[str, int]:
+        resp = await self._get_client().post(
+            f"/project/{project_id}/upload",
+            files=[
+                (name, (name + ".csv", content))
+                for name, content in name2content.items()
+            ],
+            data={
+                "selected_tables": orjson.dumps(list(range(len(name2content)))).decode()
+            },
+        )
+        if resp.status_code != 200:
+            raise Exception(f"Failed to upload table: {resp.text}")
+
+        table_ids = resp.json()["table_ids"]
+        assert len(table_ids) == len(name2content)
+        return dict(zip(name2content.keys(), table_ids))
+
+    async def aget_or_create_sm(
+        self, table_id: int, sm: IdentObj[SemanticModel]
+    ) -> dict:
+        """Get the semantic model of a table, create it if it does not exist in SAND"""
+        query = {"table": table_id, "name": self.sm_name}
+        items = await self._aget_items("semanticmodel", query)
+        if len(items) == 0:
+            resp = await self._get_client().post(
+                "/semanticmodel",
+                json={
+                    "table": table_id,
+                    "name": self.sm_name,
+                    "description": "",
+                    "version": 0,
+                    "data": to_sand_sm(sm.value),
+                },
+            )
+            assert_resp(resp)
+            items = await self._aget_items("semanticmodel", query)
+        if len(items) != 1:
+            raise Exception(
+                f"Expect one semantic model `{self.sm_name}` of table {table_id} but found {len(items)}"
+            )
+        return items[0]
+
+    async def _aget_items(self, resource: str, params: dict) -> list[dict]:
+        resp = await self._get_client().get(f"/{resource}", params=params)
+        assert_resp(resp)
+        return resp.json()["items"]
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # only called from the coroutines running in the background loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.endpoint}/api",
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=self.timeout,
+                transport=self.transport,
+            )
+        return self._client
+
+    def _run(self, coro: Coroutine[None, None, R]) -> R:
+        with self._lock:
+            if self._pid != os.getpid():
+                # first use or forked from the process owning the loop, whose thread is not copied
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="sand-curator", daemon=True
+                )
+                self._thread.start()
+                self._client = None
+                self._pid = os.getpid()
+            loop = self._loop
+        assert loop is not None
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def get_sand_table_name(table: IdentObj[ColumnBasedTable]) -> str:
+    return slugify(table.value.table_id) + "__" + shorten_key(table.key)
+
+
+def get_sand_description_file(
+    output_dir: Path, table: IdentObj[ColumnBasedTable]
+) -> Path:
+    """File to write the semantic model of a table that has been updated in SAND. Each table has its
+    own file, so the tables of a batch (see `tum.dag.process_batch`) sharing the same output directory
+    do not overwrite each other's semantic models."""
+    return output_dir / f"description.{get_sand_table_name(table)}.yml"
+
+
+def assert_resp(resp: httpx.Response, status_code: int = 200):
+    if resp.status_code != status_code:
+        raise Exception(
+            f"Expect status code {status_code} but get {resp.status_code}: {resp.text}"
+        )
@@ -42,7 +42,7 @@ from sm.prelude import I
 from smml.dataset import ColumnarDataset
 from tum.config import ONTOLOGY_FILE
 from tum.dag import PROJECT_DIR, GppSemLabelActor, GppSemLabelArgs, get_context, get_dag
-from tum.integrations.sand._common import InputTable, post_process_sm, set_table
+from tum.integrations.sand._common import post_process_sm, set_table
 from tum.integrations.sand._openai import ExampleRetriever
 from tum.sm.llm.openai_sem_label import InputTable, OpenAILiteralPrediction
 
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import math
+import numbers
+from pathlib import Path
+from typing import Any
+
+import orjson
+import xxhash
+from sm.inputs.column import Column
+from sm.inputs.table import ColumnBasedTable
+
+# bump this version when the fingerprint algorithm changes
+FINGERPRINT_VERSION = 101
+# number of values serialized at once when hashing a column
+CHUNK_SIZE = 4096
+
+
+def fingerprint_table(table: ColumnBasedTable) -> str:
+    """Compute a stable fingerprint (hex string) of a table from its id, column names, and values.
+
+    The values are hashed column by column in chunks, without serializing the whole table. The
+    fingerprint is not memoized: columns can be modified in place (`Column.__setitem__`) without any
+    trace on the table, so a memoized fingerprint could be stale.
+    """
+    hasher = xxhash.xxh3_128()
+    hasher.update(orjson.dumps([FINGERPRINT_VERSION, table.table_id]))
+    for col in table.columns:
+        hasher.update(fingerprint_column(col))
+    return hasher.hexdigest()
+
+
+def fingerprint_column(col: Column) -> bytes:
+    """Compute the fingerprint (digest) of a column.
+
+    Raise TypeError for values without a stable JSON representation (e.g., objects whose str()
+    contains their address) instead of hashing their str().
+    """
+    hasher = xxhash.xxh3_128()
+    hasher.update(orjson.dumps([col.index, col.name, len(col.values)]))
+    for i in range(0, len(col.values), CHUNK_SIZE):
+        chunk = col.values[i : i + CHUNK_SIZE]
+        data = orjson.dumps(
+            chunk, default=reject_value, option=orjson.OPT_SERIALIZE_NUMPY
+        )
+        if b"null" in data:
+            # orjson writes None, NaN, and infinity as null, so they are tagged to hash differently
+            data = orjson.dumps(
+                [tag_non_finite(value) for value in chunk],
+                default=reject_value,
+                option=orjson.OPT_SERIALIZE_NUMPY,
+            )
+        hasher.update(data)
+    return hasher.digest()
+
+
+def tag_non_finite(value: Any) -> Any:
+    if (
+        isinstance(value, numbers.Real)
+        and not isinstance(value, numbers.Integral)
+        and not math.isfinite(value)
+    ):
+        return {"$float": str(float(value))}
+    return value
+
+
+def reject_value(value: Any) -> Any:
+    raise TypeError(f"Cannot fingerprint a value of type {type(value)}")
+
+
+def fingerprint_dict(d: dict) -> str:
+    """Compute a stable fingerprint (hex string) of a JSON-serializable dictionary"""
+    return xxhash.xxh3_128_hexdigest(orjson.dumps(d))
+
+
+def fingerprint_file(file: Path) -> str:
+    """Compute the fingerprint (hex string) of the content of a file, read in chunks"""
+    hasher = xxhash.xxh3_128()
+    with open(file, "rb") as f:
+        while chunk := f.read(1 << 20):
+            hasher.update(chunk)
+    return hasher.hexdigest()
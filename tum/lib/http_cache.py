@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Sequence
+
+import httpx
+import orjson
+import xxhash
+from loguru import logger
+
+
+class HttpCache:
+    """Fetch remote files concurrently with a pooled HTTP client, caching the responses on disk.
+
+    A cached response is reused without contacting the server while it is fresh (per the
+    `Cache-Control: max-age` of the response). Otherwise, it is revalidated with a conditional request
+    using its ETag/Last-Modified headers, and the cached body is reused if the server responds with
+    304 Not Modified.
+
+    Args:
+        cachedir: directory to store the cached responses
+        max_connections: maximum number of concurrent connections
+        timeout: timeout of each request in seconds
+        transport: custom transport of the HTTP client (e.g., to test against a stub server)
+    """
+
+    def __init__(
+        self,
+        cachedir: Path,
+        max_connections: int = 16,
+        timeout: float = 60.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.cachedir = cachedir
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.transport = transport
+        # number of responses served from the cache without a request, revalidated, and downloaded
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+
+    def fetch(self, url: str) -> bytes:
+        return self.fetch_many([url])[0]
+
+    def fetch_many(self, urls: Sequence[str]) -> list[bytes]:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.afetch_many(urls))
+
+        # asyncio.run cannot be called from a running event loop (e.g., in a notebook), so the
+        # requests are sent from a new event loop in another thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.afetch_many(urls)).result()
+
+    async def afetch_many(self, urls: Sequence[str]) -> list[bytes]:
+        """Fetch the URLs concurrently, return their content in the same order"""
+        # the same URL is fetched once, so its cache entry is not written concurrently
+        unique_urls = list(dict.fromkeys(urls))
+        async with httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+            timeout=self.timeout,
+            transport=self.transport,
+            follow_redirects=True,
+        ) as client:
+            contents = await asyncio.gather(
+                *(self.afetch(client, url) for url in unique_urls)
+            )
+        url2content = dict(zip(unique_urls, contents))
+        return [url2content[url] for url in urls]
+
+    async def afetch(self, client: httpx.AsyncClient, url: str) -> bytes:
+        key = xxhash.xxh3_128_hexdigest(url.encode())
+        bodyfile = self.cachedir / f"{key}.body"
+        metafile = self.cachedir / f"{key}.json"
+
+        meta = None
+        if metafile.exists() and bodyfile.exists():
+            meta = orjson.loads(metafile.read_bytes())
+            if meta["expires"] is not None and meta["expires"] > time.time():
+                self.hits += 1
+                return bodyfile.read_bytes()
+
+        headers = {}
+        if meta is not None:
+            if meta["etag"] is not None:
+                headers["If-None-Match"] = meta["etag"]
+            if meta["last_modified"] is not None:
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        resp = await client.get(url, headers=headers)
+        if resp.status_code == 304 and meta is not None:
+            self.revalidated += 1
+            logger.debug("{} is not modified, use the cached response", url)
+            content = bodyfile.read_bytes()
+            # the 304 response may update the freshness of the cached response
+            meta["expires"] = get_expires(resp)
+            write_atomic(metafile, orjson.dumps(meta))
+            return content
+
+        resp.raise_for_status()
+        self.misses += 1
+        content = resp.content
+        if "no-store" not in resp.headers.get("Cache-Control", ""):
+            # the body is written before its metadata, so a cache entry is never partial
+            write_atomic(bodyfile, content)
+            write_atomic(
+                metafile,
+                orjson.dumps(
+                    {
+                        "url": url,
+                        "etag": resp.headers.get("ETag"),
+                        "last_modified": resp.headers.get("Last-Modified"),
+                        "expires": get_expires(resp),
+                    }
+                ),
+            )
+        return content
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+        }
+
+
+def get_expires(resp: httpx.Response) -> Optional[float]:
+    """Get the time until which the response is fresh from its Cache-Control header, None if the
+    response must be revalidated before being reused"""
+    cache_control = resp.headers.get("Cache-Control", "")
+    if "no-cache" in cache_control:
+        return None
+    m = re.search(r"max-age=(\d+)", cache_control)
+    if m is None:
+        return None
+    return time.time() + int(m.group(1))
+
+
+def write_atomic(outfile: Path, content: bytes):
+    tmpfile = outfile.with_name(f".{outfile.name}.{uuid.uuid4().hex}")
+    tmpfile.write_bytes(content)
+    os.replace(tmpfile, outfile)
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import functools
+import importlib
+import os
+import pickle
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+import orjson
+import xxhash
+from libactor.actor import Actor
+from libactor.dag import Flow, PartialFn
+from libactor.dag._dag import ComputeFn
+from libactor.misc import get_classpath
+from loguru import logger
+
+# bump this version to invalidate the cached results of all pipelines
+INCREMENTAL_VERSION = 101
+# steps with side effects (e.g., writing files), they are always executed
+DEFAULT_UNCACHED_STEPS = [
+    "duneflow.ops.writer:write_table_to_file",
+    "tum.dag:write_ttl",
+    "tum.dag:write_graph_ttl",
+]
+
+
+class IncrementalPipeline:
+    """Cache the output of every step of a linear pipeline (e.g., the `table` pipeline of `get_dag`) so
+    that reruns only recompute the steps downstream of a change.
+
+    The output of a step is keyed by the fingerprint of the pipeline's input (the content of the file
+    for a path), chained with the fingerprints of the step and all of its upstream steps (the function
+    and its PartialFn parameters, or the actor and its params). Changing the parameters of a step
+    therefore reuses the cached outputs of the upstream steps and recomputes the step and the ones after it.
+
+    The pipeline must be linear: each step only consumes the output of the previous step. Steps with
+    side effects (`uncached_steps`, e.g., writing the table to a file) are always executed, and only
+    take part in the keys of the steps after them.
+
+    Args:
+        cachedir: directory to store the cached outputs
+        uncached_steps: functions (`module:name`) that are always executed
+    """
+
+    def __init__(
+        self, cachedir: Path, uncached_steps: Sequence[str] = DEFAULT_UNCACHED_STEPS
+    ):
+        self.cachedir = cachedir
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+        self.uncached_steps = set()
+        for path in uncached_steps:
+            module, name = path.split(":")
+            try:
+                self.uncached_steps.add(
+                    get_classpath(getattr(importlib.import_module(module), name))
+                )
+            except ImportError:
+                continue
+
+        # the key of a step's output is passed to the next step of the same run through a map (id of
+        # the output -> (output, key)) local to the thread, so concurrent runs do not share their keys
+        self._local = threading.local()
+
+    def wrap(self, steps: Sequence[Flow | ComputeFn]) -> list[Flow | ComputeFn]:
+        return [
+            self.wrap_step(i, i == len(steps) - 1, step) for i, step in enumerate(steps)
+        ]
+
+    def wrap_step(
+        self, index: int, is_last: bool, step: Flow | ComputeFn
+    ) -> Flow | ComputeFn:
+        if isinstance(step, Flow):
+            return Flow(
+                source=step.source,
+                target=self.wrap_step(index, is_last, step.target),
+                cardinality=step.cardinality,
+                is_optional=step.is_optional,
+            )
+
+        fingerprint = get_step_fingerprint(step)
+        if isinstance(step, PartialFn):
+            return PartialFn(
+                self.wrap_fn(index, is_last, fingerprint, step.fn),
+                **step.default_args,
+            )
+        if isinstance(step, Actor):
+            return self.wrap_fn(index, is_last, fingerprint, step.forward)
+        return self.wrap_fn(index, is_last, fingerprint, step)
+
+    def wrap_fn(
+        self, index: int, is_last: bool, fingerprint: str, fn: Callable
+    ) -> Callable:
+        is_cacheable = get_classpath(fn) not in self.uncached_steps
+
+        # functools.wraps keeps the signature and type hints of the function for the DAG. The keyword
+        # arguments are the default arguments of a PartialFn, which are part of the step's fingerprint
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = self.get_key(index, fingerprint, args)
+            if key is None or not is_cacheable:
+                output = fn(*args, **kwargs)
+            else:
+                output = self.call(index, key, functools.partial(fn, **kwargs), args)
+
+            if key is not None and not is_last:
+                self.get_output_keys()[id(output)] = (output, key)
+            return output
+
+        return wrapper
+
+    def get_key(self, index: int, fingerprint: str, args: tuple) -> Optional[str]:
+        """Key of the output of a step, None if we can't tell if its input has changed"""
+        if index == 0:
+            # a new run starts in this thread, drop the keys left by the previous run if it failed
+            # before reaching its last step
+            self._local.output_keys = {}
+            try:
+                return hash_parts(
+                    [INCREMENTAL_VERSION, fingerprint]
+                    + [get_input_fingerprint(arg) for arg in args]
+                )
+            except TypeError:
+                logger.warning(
+                    "The input of the pipeline has no stable fingerprint, it is not cached"
+                )
+                return None
+
+        prev = self.get_output_keys().pop(id(args[0]), None)
+        if prev is None or prev[0] is not args[0]:
+            # the pipeline is not started from its first step
+            return None
+        return hash_parts([prev[1], fingerprint])
+
+    def get_output_keys(self) -> dict[int, tuple[Any, str]]:
+        if not hasattr(self._local, "output_keys"):
+            self._local.output_keys = {}
+        return self._local.output_keys
+
+    def call(self, index: int, key: str, fn: Callable, args: tuple) -> Any:
+        cachefile = self.cachedir / f"{key}.pkl"
+        if cachefile.exists():
+            try:
+                with open(cachefile, "rb") as f:
+                    output = pickle.load(f)
+                logger.debug("Reuse the cached output of step {} ({})", index, key)
+                return output
+            except Exception:
+                logger.exception("Cannot load the cached output {}", cachefile)
+
+        output = fn(*args)
+        try:
+            tmpfile = cachefile.with_name(f".{cachefile.name}.{uuid.uuid4().hex}")
+            with open(tmpfile, "wb") as f:
+                pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpfile, cachefile)
+        except Exception:
+            logger.exception("Cannot cache the output of step {}", index)
+        return output
+
+
+def get_step_fingerprint(step: ComputeFn) -> str:
+    """Fingerprint of a step from its function/actor and its parameters"""
+    if isinstance(step, Actor):
+        parts = [
+            get_classpath(step.__class__),
+            step.VERSION,
+            step.get_actor_state().to_dict(),
+        ]
+    elif isinstance(step, PartialFn):
+        parts = [get_classpath(step.fn), step.default_args]
+    else:
+        parts = [get_classpath(step)]
+    return hash_parts(parts)
+
+
+def get_input_fingerprint(value: Any) -> str:
+    """Fingerprint of an input of a pipeline, a path is fingerprinted by the content of the file"""
+    if isinstance(value, Path) and value.is_file():
+        hasher = xxhash.xxh3_128()
+        with open(value, "rb") as f:
+            while chunk := f.read(1 << 20):
+                hasher.update(chunk)
+        return hash_parts([str(value.resolve()), hasher.hexdigest()])
+    return hash_parts([value])
+
+
+def hash_parts(parts: list) -> str:
+    """Hash JSON-like values, raise TypeError for values without a stable representation (e.g.,
+    objects whose str() contains their address)"""
+    return xxhash.xxh3_128_hexdigest(
+        orjson.dumps(
+            parts,
+            default=to_stable_json,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        )
+    )
+
+
+def to_stable_json(value: Any) -> Any:
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=lambda x: orjson.dumps(x, default=to_stable_json))
+    raise TypeError(f"Cannot fingerprint a value of type {type(value)}")
@@ -0,0 +1,436 @@
+from __future__ import annotations
+
+import gc
+import gzip
+import hashlib
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+    Sequence,
+)
+
+import orjson
+import serde.json
+from hugedict.prelude import CacheDict, RocksDBDict
+from kgdata.dataset import Dataset
+from kgdata.db import build_database
+from kgdata.spark.extended_rdd import DatasetSignature, ExtendedRDD
+from loguru import logger
+from tum.lib.fingerprint import fingerprint_file
+
+if TYPE_CHECKING:
+    from hugedict.core.rocksdb import FileFormat
+
+# bump this version to rebuild the datasets and databases from scratch
+INCREMENTAL_DB_VERSION = 100
+# files recording the inputs of a dataset, and the partitions loaded into a database
+INPUTS_FILE = "_INPUTS"
+PARTITIONS_FILE = "_PARTITIONS"
+# the checksum of a dataset is the sum of the sha256 of its lines modulo this number (see `ExtendedRDD.hash`)
+CHECKSUM_MODULO = 2**256 - 1
+# spark: the first build of a dataset runs on Spark; local: all builds run in a pool of processes
+Backend = Literal["spark", "local"]
+# (input files, workers) -> the records of each input file, yielded as soon as they are built
+BuildPartitions = Callable[
+    [Sequence[str], Optional[int]], Iterator[tuple[str, Iterable[bytes]]]
+]
+DEFAULT_FORMAT: FileFormat = {
+    "record_type": {"type": "ndjson", "key": "id", "value": None},
+    "is_sorted": False,
+}
+
+
+@dataclass
+class DatasetInputs:
+    """Fingerprints of the input files of a dataset, and the partition built from each of them.
+    Stored in `<dataset dir>/_INPUTS`."""
+
+    # input file -> fingerprint of its content
+    fingerprints: dict[str, str]
+    # input file -> name of its partition
+    partitions: dict[str, str]
+
+    @staticmethod
+    def load(ds: Dataset) -> Optional[DatasetInputs]:
+        infile = ds.get_data_directory() / INPUTS_FILE
+        if not infile.exists():
+            return None
+        record = orjson.loads(infile.read_bytes())
+        if record["version"] != INCREMENTAL_DB_VERSION:
+            return None
+        return DatasetInputs(record["fingerprints"], record["partitions"])
+
+    def save(self, ds: Dataset):
+        (ds.get_data_directory() / INPUTS_FILE).write_bytes(
+            orjson.dumps(
+                {
+                    "version": INCREMENTAL_DB_VERSION,
+                    "fingerprints": self.fingerprints,
+                    "partitions": self.partitions,
+                },
+                option=orjson.OPT_INDENT_2,
+            )
+        )
+
+
+def build_partitioned_dataset(
+    ds: Dataset,
+    input_files: Sequence[Path],
+    build_partition: Callable[[str], Iterable[bytes]],
+    backend: Backend = "spark",
+    workers: Optional[int] = None,
+    build_partitions: Optional[BuildPartitions] = None,
+):
+    """Build a dataset in which each input file is built into its own partition by `build_partition`.
+
+    The first build runs on Spark (or in a pool of processes with the local backend) and records the
+    fingerprints of the input files. The next builds only rebuild the partitions of the input files that
+    are new or modified, and drop the partitions of the deleted ones. The partitions are rebuilt in a
+    pool of processes, so `build_partition` must be picklable. The checksum of the dataset is then
+    recomputed from its partitions.
+
+    Outside of Spark, `build_partitions` (if given) replaces the pool: it receives the input files to
+    build (largest first) and yields the records of each file as soon as they are ready, which are
+    then written by this process. It must yield the same records as `build_partition`.
+
+    Both backends write the same records to the same partitions, and the same signature except for its
+    creation time.
+    """
+    input_files = sort_by_size(input_files)
+    fingerprints = {str(file): fingerprint_file(file) for file in input_files}
+
+    prev = None
+    # the signatures of the dependencies are not verified as they are updated below
+    if ds.has_complete_data(verify_dependencies_signature=False):
+        prev = DatasetInputs.load(ds)
+        if prev is None:
+            logger.info(
+                "Dataset {} does not record its inputs, rebuild it", ds.get_name()
+            )
+            shutil.rmtree(ds.get_data_directory())
+
+    if prev is None:
+        # one input per partition, so the i-th input is written to part-{i:05d}
+        infiles = list(fingerprints.keys())
+        partitions = {file: f"part-{i:05d}.gz" for i, file in enumerate(infiles)}
+        if backend == "spark":
+            # the inputs are sorted largest first, so are the tasks scheduled by spark
+            ExtendedRDD.parallelize(infiles, numSlices=max(len(infiles), 1)).flatMap(
+                build_partition
+            ).save_like_dataset(ds, trust_dataset_dependencies=True)
+        else:
+            datadir = ds.get_data_directory()
+            datadir.mkdir(parents=True)
+            if len(infiles) == 0:
+                # spark writes an empty partition for an empty dataset
+                write_partition(lambda _: [], "", datadir / "part-00000.gz")
+            write_partitions(
+                build_partition,
+                {file: datadir / partitions[file] for file in infiles},
+                workers,
+                build_partitions,
+            )
+            sign_dataset(ds)
+            (datadir / "_SUCCESS").touch()
+        DatasetInputs(fingerprints, partitions).save(ds)
+        return
+
+    changed = [
+        file
+        for file, fingerprint in fingerprints.items()
+        if prev.fingerprints.get(file) != fingerprint
+    ]
+    removed = [file for file in prev.fingerprints if file not in fingerprints]
+    if len(changed) == 0 and len(removed) == 0 and is_dependencies_up_to_date(ds):
+        logger.info("Dataset {} is up to date", ds.get_name())
+        return
+
+    logger.info(
+        "Update dataset {}: rebuild {} partitions and remove {} partitions",
+        ds.get_name(),
+        len(changed),
+        len(removed),
+    )
+    datadir = ds.get_data_directory()
+    # an interrupted update leaves the dataset incomplete, so it is rebuilt from scratch next time
+    (datadir / "_SUCCESS").unlink()
+
+    next_id = 1 + max(
+        (int(file.name.split(".")[0][5:]) for file in datadir.glob("part-*")),
+        default=-1,
+    )
+    partitions = {
+        file: prev.partitions[file]
+        for file in fingerprints
+        if file not in changed and file in prev.partitions
+    }
+    for file in changed:
+        partitions[file] = f"part-{next_id:05d}.gz"
+        next_id += 1
+
+    write_partitions(
+        build_partition,
+        {file: datadir / partitions[file] for file in changed},
+        workers,
+        build_partitions,
+    )
+
+    for file in changed + removed:
+        if file in prev.partitions:
+            remove_partition(datadir / prev.partitions[file])
+
+    sign_dataset(ds)
+    DatasetInputs(fingerprints, partitions).save(ds)
+    (datadir / "_SUCCESS").touch()
+
+
+def sort_by_size(files: Sequence[Path]) -> list[Path]:
+    """Sort files by their sizes, the largest first"""
+    return sorted(files, key=lambda file: (-file.stat().st_size, str(file)))
+
+
+def write_partitions(
+    build_partition: Callable[[str], Iterable[bytes]],
+    infile2outfile: dict[str, Path],
+    workers: Optional[int] = None,
+    build_partitions: Optional[BuildPartitions] = None,
+):
+    """Build the partitions of the input files in a pool of processes, or with `build_partitions`"""
+    if len(infile2outfile) == 0:
+        return
+    if build_partitions is not None:
+        for infile, records in build_partitions(list(infile2outfile.keys()), workers):
+            write_records(records, infile2outfile[infile])
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for _ in executor.map(
+            write_partition,
+            [build_partition] * len(infile2outfile),
+            infile2outfile.keys(),
+            infile2outfile.values(),
+        ):
+            pass
+
+
+def write_partition(
+    build_partition: Callable[[str], Iterable[bytes]], infile: str, outfile: Path
+):
+    write_records(build_partition(infile), outfile)
+
+
+def write_records(records: Iterable[bytes], outfile: Path):
+    # the temporary file is hidden so it is not read as a partition
+    tmpfile = outfile.with_name(f".{outfile.name}.tmp")
+    # no file name nor modification time in the gzip header, so the same records give the same bytes
+    with (
+        open(tmpfile, "wb") as raw,
+        gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0) as f,
+    ):
+        for record in records:
+            f.write(record + b"\n")
+    os.replace(tmpfile, outfile)
+
+
+def remove_partition(file: Path):
+    file.unlink(missing_ok=True)
+    # checksum file written by hadoop
+    file.with_name(f".{file.name}.crc").unlink(missing_ok=True)
+
+
+def iter_partition(file: Path | str) -> Iterator[bytes]:
+    """Iterate over the records (lines without the newline) of a partition"""
+    with gzip.open(file, "rb") as f:
+        for line in f:
+            yield line[:-1] if line.endswith(b"\n") else line
+
+
+def compute_checksum(files: Iterable[Path | str]) -> str:
+    """Checksum of a dataset from its partitions, equal to the one computed by Spark (`ExtendedRDD.hash`)"""
+    total = 0
+    for file in files:
+        for record in iter_partition(file):
+            total += int.from_bytes(hashlib.sha256(record).digest(), "little")
+    return (total % CHECKSUM_MODULO).to_bytes(32, "little").hex()
+
+
+def sign_dataset(ds: Dataset):
+    """Write the signature of the dataset from its partitions and the signatures of its dependencies"""
+    sig = DatasetSignature(
+        name=ds.get_name(),
+        created_at=str(datetime.now().astimezone()),
+        checksum=compute_checksum(sorted(ds.get_files())),
+        dependencies={
+            (s := dep.get_signature()).name: s for dep in ds.get_dependencies()
+        },
+    )
+    serde.json.ser(sig.to_dict(), ds.get_data_directory() / "_SIGNATURE", indent=2)
+
+
+def is_dependencies_up_to_date(ds: Dataset) -> bool:
+    sig = ds.get_signature()
+    return all(
+        sig.dependencies.get(dep.get_name()) == dep.get_signature()
+        for dep in ds.get_dependencies()
+    )
+
+
+def update_database(
+    ds: Dataset,
+    get_db: Callable[[], Any],
+    compact: bool,
+    format: Optional[FileFormat] = None,
+):
+    """Load the dataset into its database.
+
+    The keys of each loaded partition are recorded in `<db dir>/_PARTITIONS`. When the dataset has
+    changed since the database was built, only the keys of the modified partitions are deleted and
+    written again. Otherwise (no record of the partitions), the database is rebuilt with `build_database`.
+    """
+    fileformat = format or DEFAULT_FORMAT
+    key = fileformat["record_type"]["key"]
+    assert key is not None
+    dbpath = get_db_path(get_db)
+    sig_file = dbpath / "_SIGNATURE"
+    partitions_file = dbpath / PARTITIONS_FILE
+
+    ds_sig = ds.get_signature()
+    fingerprints = {
+        Path(file).name: fingerprint_file(Path(file)) for file in ds.get_files()
+    }
+    datadir = ds.get_data_directory()
+
+    prev = None
+    if partitions_file.exists() and sig_file.exists():
+        record = orjson.loads(partitions_file.read_bytes())
+        if record["version"] == INCREMENTAL_DB_VERSION:
+            prev = record["partitions"]
+
+    if sig_file.exists() and prev is None:
+        db_sig = DatasetSignature.from_dict(serde.json.deser(sig_file))
+        if db_sig == ds_sig:
+            # the database was built before its partitions were recorded
+            write_db_partitions(
+                partitions_file,
+                {
+                    name: (fingerprint, get_partition_keys(datadir / name, key))
+                    for name, fingerprint in fingerprints.items()
+                },
+            )
+            logger.info("Database of {} is up to date", ds.get_name())
+            return
+
+    if prev is None:
+        if sig_file.exists():
+            logger.info("Rebuild the database of {} from scratch", ds.get_name())
+        if dbpath.exists():
+            shutil.rmtree(dbpath)
+        build_database(ds, get_db, compact=compact, format=format)
+        write_db_partitions(
+            partitions_file,
+            {
+                name: (fingerprint, get_partition_keys(datadir / name, key))
+                for name, fingerprint in fingerprints.items()
+            },
+        )
+        return
+
+    partitions = {
+        name: (part["fingerprint"], part["keys"])
+        for name, part in prev.items()
+        if fingerprints.get(name) == part["fingerprint"]
+    }
+    added = [name for name in fingerprints if name not in partitions]
+    removed = [name for name in prev if name not in partitions]
+    if len(added) == 0 and len(removed) == 0:
+        if DatasetSignature.from_dict(serde.json.deser(sig_file)) != ds_sig:
+            serde.json.ser(ds_sig.to_dict(), sig_file)
+        logger.info("Database of {} is up to date", ds.get_name())
+        return
+
+    logger.info(
+        "Update the database of {}: write {} partitions and delete {} partitions",
+        ds.get_name(),
+        len(added),
+        len(removed),
+    )
+    # an interrupted update leaves the database without signature, so it is rebuilt from scratch next time
+    sig_file.unlink()
+
+    db = get_rocksdb(get_db)
+    written_keys = set()
+    for name in added:
+        keys = []
+        for record in iter_partition(datadir / name):
+            k = get_record_key(record, key)
+            db._put(k.encode(), record)
+            keys.append(k)
+        written_keys.update(keys)
+        partitions[name] = (fingerprints[name], keys)
+
+    kept_keys = set()
+    for name, (_, keys) in partitions.items():
+        if name not in added:
+            kept_keys.update(keys)
+    for name in removed:
+        for k in prev[name]["keys"]:
+            if k not in written_keys and k not in kept_keys:
+                del db[k]
+    if compact:
+        db.compact(None, None)
+    del db
+    gc.collect()
+
+    write_db_partitions(partitions_file, partitions)
+    serde.json.ser(ds_sig.to_dict(), sig_file)
+
+
+def get_rocksdb(get_db: Callable[[], Any]) -> RocksDBDict:
+    db = get_db()
+    while isinstance(db, CacheDict):
+        db = db.mapping
+    assert isinstance(db, RocksDBDict)
+    return db
+
+
+def get_db_path(get_db: Callable[[], Any]) -> Path:
+    dbpath = Path(get_rocksdb(get_db).path)
+    # release the database so it can be opened again
+    gc.collect()
+    return dbpath
+
+
+def get_record_key(record: bytes, key: str) -> str:
+    """Get the key of a record of a ndjson file, a numeric key is the index of the key in a list"""
+    obj = orjson.loads(record)
+    if isinstance(obj, list):
+        return obj[int(key)]
+    return obj[key]
+
+
+def get_partition_keys(file: Path, key: str) -> list[str]:
+    return [get_record_key(record, key) for record in iter_partition(file)]
+
+
+def write_db_partitions(outfile: Path, partitions: dict[str, tuple[str, list[str]]]):
+    outfile.write_bytes(
+        orjson.dumps(
+            {
+                "version": INCREMENTAL_DB_VERSION,
+                "partitions": {
+                    name: {"fingerprint": fingerprint, "keys": keys}
+                    for name, (fingerprint, keys) in partitions.items()
+                },
+            }
+        )
+    )
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterator, Optional, Sequence
+
+import orjson
+
+if TYPE_CHECKING:
+    from libactor.dag import DAG
+    from libactor.dag._dag import ActorNode
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+@dataclass
+class NodeMeasurement:
+    """Resource usage of one invocation of a DAG node"""
+
+    # label of the table being processed (empty if not processed inside `DAGInstrument.table`)
+    table: str
+    # id of the node in the DAG, e.g., `export:1`
+    node: str
+    # the top-level node (key in `DAG.from_dictmap`) that the node belongs to, e.g., `export`
+    stage: str
+    # name of the actor or function of the node, e.g., `write_ttl`
+    actor: str
+    wall_time: float
+    cpu_time: float
+    # growth of the peak resident set size of the process (bytes)
+    peak_rss_delta: int
+    # peak of memory allocated by python during the invocation (bytes), 0 if tracemalloc is not enabled
+    tracemalloc_peak: int
+
+
+class DAGInstrument:
+    """Record wall time, CPU time, and memory of every node invocation of DAGs.
+
+    Usage:
+        instrument = DAGInstrument()
+        dag = get_dag(..., instrument=instrument)
+        with instrument.table("table-1"):
+            dag.process(...)
+        instrument.to_jsonl("measurements.jsonl")
+
+    Args:
+        trace_memory: whether to use tracemalloc to measure the allocated memory, it is accurate
+            but slows down the invocations considerably
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.records: list[NodeMeasurement] = []
+        self.current_table = ""
+
+    def attach(self, dag: DAG):
+        """Instrument all nodes of the DAG"""
+        node2stage = {
+            uid: stage for stage, uids in dag.pipeline_idmap.items() for uid in uids
+        }
+        for u in dag.graph.iter_nodes():
+            if isinstance(u.invoke, InstrumentedInvoke):
+                raise ValueError(f"Node `{u.id}` has already been instrumented")
+            u.invoke = InstrumentedInvoke(self, u, node2stage.get(u.id, u.id))
+        return dag
+
+    @contextmanager
+    def table(self, name: str) -> Iterator[list[NodeMeasurement]]:
+        """Label the invocations within this block with the given table, yield the measurements
+        recorded in the block"""
+        prev_table, self.current_table = self.current_table, name
+        start = len(self.records)
+        measurements: list[NodeMeasurement] = []
+        try:
+            yield measurements
+        finally:
+            self.current_table = prev_table
+            measurements.extend(self.records[start:])
+
+    def measure(self, u: ActorNode, stage: str, args: Sequence, context: Sequence):
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            start_mem = tracemalloc.get_traced_memory()[0]
+
+        start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start_cpu = time.process_time()
+        start_wall = time.perf_counter()
+        try:
+            return invoke_node(u, args, context)
+        finally:
+            wall_time = time.perf_counter() - start_wall
+            cpu_time = time.process_time() - start_cpu
+            end_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if self.trace_memory:
+                tracemalloc_peak = tracemalloc.get_traced_memory()[1] - start_mem
+            else:
+                tracemalloc_peak = 0
+
+            self.records.append(
+                NodeMeasurement(
+                    table=self.current_table,
+                    node=str(u.id),
+                    stage=str(stage),
+                    actor=get_actor_name(u.actor),
+                    wall_time=wall_time,
+                    cpu_time=cpu_time,
+                    peak_rss_delta=(end_rss - start_rss) * RSS_UNIT,
+                    tracemalloc_peak=max(tracemalloc_peak, 0),
+                )
+            )
+
+    def summary(
+        self, by_table: bool = False
+    ) -> dict[tuple[str, ...], dict[str, float]]:
+        """Aggregate the measurements per node (and per table if `by_table` is True)"""
+        groups: dict[tuple[str, ...], dict[str, float]] = defaultdict(
+            lambda: {
+                "count": 0,
+                "wall_time": 0.0,
+                "cpu_time": 0.0,
+                "peak_rss_delta": 0,
+                "tracemalloc_peak": 0,
+            }
+        )
+        for r in self.records:
+            key = (r.stage, r.node, r.actor)
+            if by_table:
+                key = (r.table,) + key
+            group = groups[key]
+            group["count"] += 1
+            group["wall_time"] += r.wall_time
+            group["cpu_time"] += r.cpu_time
+            group["peak_rss_delta"] = max(group["peak_rss_delta"], r.peak_rss_delta)
+            group["tracemalloc_peak"] = max(
+                group["tracemalloc_peak"], r.tracemalloc_peak
+            )
+        return dict(groups)
+
+    def to_jsonl(self, outfile: Optional[Path | str] = None) -> str:
+        """Export the measurements as JSON lines, write them to `outfile` if provided"""
+        text = "".join(
+            orjson.dumps(asdict(r), option=orjson.OPT_APPEND_NEWLINE).decode()
+            for r in self.records
+        )
+        if outfile is not None:
+            Path(outfile).write_text(text)
+        return text
+
+    def to_prometheus(
+        self, outfile: Optional[Path | str] = None, prefix: str = "tum_dag_node"
+    ) -> str:
+        """Export a snapshot of the aggregated measurements in the Prometheus text format,
+        write them to `outfile` if provided (e.g., for node_exporter's textfile collector)
+        """
+        summary = self.summary()
+        metrics: list[tuple[str, str, str, str]] = [
+            ("invocations_total", "counter", "Number of invocations", "count"),
+            ("wall_seconds_total", "counter", "Wall time spent", "wall_time"),
+            ("cpu_seconds_total", "counter", "CPU time spent", "cpu_time"),
+            (
+                "peak_rss_delta_bytes",
+                "gauge",
+                "Max growth of the peak resident set size during an invocation",
+                "peak_rss_delta",
+            ),
+            (
+                "tracemalloc_peak_bytes",
+                "gauge",
+                "Max memory allocated by python during an invocation",
+                "tracemalloc_peak",
+            ),
+        ]
+
+        lines = []
+        for name, type, help, field in metrics:
+            lines.append(f"# HELP {prefix}_{name} {help} per DAG node")
+            lines.append(f"# TYPE {prefix}_{name} {type}")
+            for (stage, node, actor), group in sorted(summary.items()):
+                labels = ",".join(
+                    f'{k}="{escape_label_value(v)}"'
+                    for k, v in [("stage", stage), ("node", node), ("actor", actor)]
+                )
+                lines.append(f"{prefix}_{name}{{{labels}}} {group[field]}")
+
+        text = "\n".join(lines) + "\n"
+        if outfile is not None:
+            Path(outfile).write_text(text)
+        return text
+
+
+class InstrumentedInvoke:
+    """Replacement of `ActorNode.invoke` that records the invocations into the instrument"""
+
+    def __init__(self, instrument: DAGInstrument, node: ActorNode, stage: str):
+        self.instrument = instrument
+        self.node = node
+        self.stage = stage
+
+    def __call__(self, args: Sequence, context: Sequence):
+        return self.instrument.measure(self.node, self.stage, args, context)
+
+
+def invoke_node(u: ActorNode, args: Sequence, context: Sequence):
+    # call the original method of the class as the instance's one is replaced by the instrument
+    return type(u).invoke(u, args, context)
+
+
+def get_actor_name(actor: Any) -> str:
+    from libactor.actor import Actor
+    from libactor.dag import PartialFn
+
+    if isinstance(actor, Actor):
+        return type(actor).__name__
+    if isinstance(actor, PartialFn):
+        actor = actor.fn
+    return getattr(actor, "__name__", type(actor).__name__)
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import os
+from collections import Counter
+from functools import cached_property
+from pathlib import Path
+from typing import Iterable, Optional
+
+import orjson
+import typer
+import xxhash
+from loguru import logger
+from minmodkg.entity_linking import Doc, EntityLinking, FeatExtractor
+from rdflib import Graph
+from tum.config import CRITICAL_MAAS_DIR, LINKER_INDEX_FILE
+
+# bump this version when the format of the index changes
+LINKER_INDEX_VERSION = 100
+# linkers compiled into the index, in the order they must be created (state_or_province depends on country)
+LINKER_NAMES = [
+    "country",
+    "state_or_province",
+    "crs",
+    "category",
+    "unit",
+    "commodity",
+    "commodity_form",
+]
+# linkers whose labels form the SymSpell dictionary of UnitAndCommodityLinker
+SYMSPELL_LINKER_NAMES = ["unit", "commodity", "commodity_form"]
+
+app = typer.Typer(pretty_exceptions_short=True, pretty_exceptions_enable=False)
+
+
+class LinkerIndex:
+    """Entity linkers compiled from the entity files of a directory, loaded from a prebuilt index file.
+
+    The index is a single JSON file (see `build_linker_index`), which is parsed with orjson instead of
+    parsing the turtle files with rdflib. Each process that loads the index has its own copy of the
+    linkers. Worker processes forked after loading the index inherit the linkers instead of reading the
+    index again, but their memory is not shared for long: updating the reference counts of the objects
+    copies their pages.
+    """
+
+    def __init__(
+        self,
+        entity_dir: Path,
+        linkers: dict[str, IndexedEntityLinking],
+        symspell_words: dict[str, int],
+    ):
+        self.entity_dir = entity_dir
+        self.linkers = linkers
+        self.symspell_words = symspell_words
+
+
+class IndexedEntityLinking(EntityLinking):
+    """EntityLinking whose documents are loaded from the linker index, the graph of the entities is
+    only parsed if it is accessed"""
+
+    def __init__(self, data_file: Path, docs: list[Doc]):
+        # EntityLinking.__init__ is not called as it parses the entity file, which the index avoids.
+        # It only sets the attributes below (`g` is a lazy property here), which are all the attributes
+        # that the methods of EntityLinking use
+        self.data_file = data_file
+        self.docs = docs
+        self.id2doc = {doc.id: doc for doc in self.docs}
+        self.feat_extractor = FeatExtractor()
+
+    @cached_property
+    def g(self) -> Graph:  # type: ignore
+        g = Graph()
+        g.parse(self.data_file, format="turtle")
+        return g
+
+
+# the indexes loaded in this process, keyed by their entity directories
+_loaded_indexes: dict[Path, LinkerIndex] = {}
+# the entity directories whose index is missing or outdated -> the versions of their entity files and
+# index file when it was checked, so the index is not read again until one of them changes
+_unusable_indexes: dict[Path, tuple[str, str]] = {}
+
+
+def build_linker_index(entity_dir: Path, outfile: Path) -> None:
+    """Compile the linkers of the entities in `entity_dir` into the index file (written atomically)"""
+    entity_dir = Path(entity_dir)
+    linkers = {}
+    for name in LINKER_NAMES:
+        linker = EntityLinking.get_instance(entity_dir, name)  # type: ignore
+        linkers[name] = [[doc.id, doc.labels, doc.props] for doc in linker.docs]
+
+    symspell_words = count_symspell_words(
+        EntityLinking.get_instance(entity_dir, name)  # type: ignore
+        for name in SYMSPELL_LINKER_NAMES
+    )
+
+    outfile.parent.mkdir(parents=True, exist_ok=True)
+    tmpfile = outfile.with_name(f".{outfile.name}.{os.getpid()}.tmp")
+    tmpfile.write_bytes(
+        orjson.dumps(
+            {
+                "version": LINKER_INDEX_VERSION,
+                "sources": get_sources_version(entity_dir),
+                "linkers": linkers,
+                "symspell": symspell_words,
+            }
+        )
+    )
+    os.replace(tmpfile, outfile)
+
+
+def load_linker_index(
+    entity_dir: Path, index_file: Path = LINKER_INDEX_FILE
+) -> Optional[LinkerIndex]:
+    """Load the linker index of `entity_dir` and register its linkers to `EntityLinking.get_instance`.
+
+    Return None (the linkers are then built from the entity files) if the index does not exist or is
+    outdated, i.e., the entity files have been modified after the index was built. The result is
+    remembered until the entity files or the index file change, so the index is not read again.
+    """
+    entity_dir = Path(entity_dir)
+    if entity_dir in _loaded_indexes:
+        return _loaded_indexes[entity_dir]
+
+    sources_version = get_sources_version(entity_dir)
+    versions = (sources_version, get_index_file_version(index_file))
+    if _unusable_indexes.get(entity_dir) == versions:
+        return None
+    if not index_file.exists():
+        _unusable_indexes[entity_dir] = versions
+        return None
+
+    record = orjson.loads(index_file.read_bytes())
+    if (
+        record["version"] != LINKER_INDEX_VERSION
+        or record["sources"] != sources_version
+    ):
+        logger.warning(
+            "The linker index {} is outdated, rebuild it with `python -m tum.lib.linker_index`",
+            index_file,
+        )
+        _unusable_indexes[entity_dir] = versions
+        return None
+
+    index = LinkerIndex(
+        entity_dir,
+        {
+            name: IndexedEntityLinking(
+                entity_dir / f"{name}.ttl",
+                [Doc(id, labels, props) for id, labels, props in docs],
+            )
+            for name, docs in record["linkers"].items()
+        },
+        record["symspell"],
+    )
+    for name, linker in index.linkers.items():
+        EntityLinking.instances.setdefault(name, linker)
+    _loaded_indexes[entity_dir] = index
+    _unusable_indexes.pop(entity_dir, None)
+    return index
+
+
+def get_loaded_index(entity_dir: Path | str) -> Optional[LinkerIndex]:
+    return _loaded_indexes.get(Path(entity_dir))
+
+
+def count_symspell_words(linkers: Iterable[EntityLinking]) -> dict[str, int]:
+    """Count of each label in the SymSpell dictionary of the linkers (each occurrence adds 2)"""
+    counter = Counter()
+    for linker in linkers:
+        for doc in linker.docs:
+            for label in doc.labels:
+                if label == "":
+                    continue
+                counter[label] += 2
+    return dict(counter)
+
+
+def get_sources_version(entity_dir: Path) -> str:
+    """Version of the entity files of the linkers from their modification time and size"""
+    versions = []
+    for name in LINKER_NAMES:
+        try:
+            stat = (entity_dir / f"{name}.ttl").stat()
+            versions.append(f"{name}:{stat.st_mtime_ns}-{stat.st_size}")
+        except FileNotFoundError:
+            versions.append(f"{name}:missing")
+    return xxhash.xxh3_64_hexdigest("|".join(versions))
+
+
+def get_index_file_version(index_file: Path) -> str:
+    try:
+        stat = index_file.stat()
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+    except FileNotFoundError:
+        return "missing"
+
+
+@app.command()
+def main(
+    entity_dir: Path = typer.Option(
+        CRITICAL_MAAS_DIR / "kgdata/data/entities",
+        help="Directory of the predefined entities",
+    ),
+    outfile: Path = typer.Option(LINKER_INDEX_FILE, help="Path of the index file"),
+):
+    build_linker_index(entity_dir, outfile)
+    print("Built the linker index", outfile)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import orjson
+import xxhash
+from minmodkg.entity_linking import Doc, IEntityLinking
+
+# bump this version to invalidate the persisted linking results
+LINKING_CACHE_VERSION = 101
+
+
+class LinkingCache:
+    """Cache of the entity linking results of multiple linkers, keyed by the linker's identity and the
+    query.
+
+    The results can be persisted to a JSON file and reused across runs. The identity of a linker includes
+    the modification time and size of its data files (if any), so the persisted results are invalidated
+    when the entities are updated.
+    """
+
+    def __init__(self, cache_file: Optional[Path] = None):
+        self.cache_file = cache_file
+        self.linkers: dict[str, CachedLinker] = {}
+        # hits & misses of the linkers of other processes (see `merge`)
+        self.merged_stats: dict[str, list[int]] = {}
+        self.persisted: dict[str, dict[str, Optional[tuple[str, float]]]] = {}
+        if cache_file is not None and cache_file.exists():
+            record = orjson.loads(cache_file.read_bytes())
+            if record.get("version") == LINKING_CACHE_VERSION:
+                self.persisted = {
+                    linker_id: {
+                        text: (tuple(res) if res is not None else None)  # type: ignore
+                        for text, res in results.items()
+                    }
+                    for linker_id, results in record["linkers"].items()
+                }
+
+    def wrap(self, name: str, linker: IEntityLinking) -> CachedLinker:
+        """Wrap a linker to cache its results"""
+        linker_id = f"{name}:{get_linker_version(linker)}"
+        if linker_id not in self.linkers:
+            self.linkers[linker_id] = CachedLinker(
+                name, linker, self.persisted.get(linker_id, {})
+            )
+        return self.linkers[linker_id]
+
+    def save(self):
+        """Persist the results to the cache file (written atomically)"""
+        assert self.cache_file is not None
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        linkers = dict(self.persisted)
+        linkers.update(
+            {linker_id: linker.cache for linker_id, linker in self.linkers.items()}
+        )
+        tmp_file = self.cache_file.with_name(
+            f".{self.cache_file.name}.{os.getpid()}.tmp"
+        )
+        tmp_file.write_bytes(
+            orjson.dumps({"version": LINKING_CACHE_VERSION, "linkers": linkers})
+        )
+        os.replace(tmp_file, self.cache_file)
+
+    def pop_updates(self) -> dict[str, dict]:
+        """Get the results and the hits & misses of the linkers since the last call, used to send the
+        updates of a worker process to the main process (see `merge`)"""
+        updates = {}
+        for linker_id, linker in self.linkers.items():
+            updates[linker_id] = {
+                "name": linker.name,
+                "results": {key: linker.cache[key] for key in linker.new_keys},
+                "hits": linker.hits,
+                "misses": linker.misses,
+            }
+            linker.new_keys = []
+            linker.hits = 0
+            linker.misses = 0
+        return updates
+
+    def merge(self, updates: dict[str, dict]):
+        """Merge the updates of another process (see `pop_updates`)"""
+        for linker_id, update in updates.items():
+            if linker_id in self.linkers:
+                self.linkers[linker_id].cache.update(update["results"])
+            else:
+                self.persisted.setdefault(linker_id, {}).update(update["results"])
+            stats = self.merged_stats.setdefault(update["name"], [0, 0])
+            stats[0] += update["hits"]
+            stats[1] += update["misses"]
+
+    def report(self) -> dict[str, dict]:
+        """Get the hit rate and size of the cache of each linker"""
+        stats = {name: list(counts) for name, counts in self.merged_stats.items()}
+        for linker in self.linkers.values():
+            counts = stats.setdefault(linker.name, [0, 0])
+            counts[0] += linker.hits
+            counts[1] += linker.misses
+
+        sizes = {}
+        for linker_id, results in self.persisted.items():
+            sizes[linker_id.split(":", 1)[0]] = len(results)
+        for linker in self.linkers.values():
+            sizes[linker.name] = len(linker.cache)
+
+        return {
+            name: {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses > 0 else 0.0,
+                "size": sizes.get(name, 0),
+            }
+            for name, (hits, misses) in stats.items()
+        }
+
+
+class CachedLinker(IEntityLinking):
+    def __init__(
+        self,
+        name: str,
+        linker: IEntityLinking,
+        cache: dict[str, Optional[tuple[str, float]]],
+    ):
+        self.name = name
+        self.linker = linker
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        # keys added since the last `LinkingCache.pop_updates`
+        self.new_keys: list[str] = []
+
+    def link(
+        self, query: str, has_props: Optional[dict[str, str]] = None
+    ) -> Optional[tuple[Doc, float]]:
+        if has_props is not None:
+            return self.linker.link(query, has_props)
+
+        # the linkers score the raw text, so queries differing only by whitespace are cached separately
+        key = query
+        if key in self.cache:
+            self.hits += 1
+            res = self.cache[key]
+        else:
+            self.misses += 1
+            ent_score = self.linker.link(query)
+            res = (ent_score[0].id, ent_score[1]) if ent_score is not None else None
+            self.cache[key] = res
+            self.new_keys.append(key)
+
+        if res is None:
+            return None
+        return Doc(id=res[0], labels=[], props={}), res[1]
+
+
+def get_linker_version(linker: IEntityLinking) -> str:
+    """Get the version of a linker from its data files.
+
+    The journal of a trust file is not part of the version: it only receives the links of texts that
+    have no trusted link yet, which are the results the linker returns for them anyway. Otherwise, every
+    run saving a new link would invalidate the cached results and the record fingerprints of the MOS
+    mapping (see `MosMapping.get_record_fingerprints`).
+    """
+    files = []
+    for attr in ["data_file", "trust_file"]:
+        if hasattr(linker, attr):
+            files.append(Path(getattr(linker, attr)))
+    if hasattr(linker, "unit_and_commodity_linker"):
+        return get_linker_version(getattr(linker, "unit_and_commodity_linker"))
+    if hasattr(linker, "entity_dir"):
+        files.extend(sorted(Path(getattr(linker, "entity_dir")).glob("*.ttl")))
+    version = get_files_version(files)
+    # the typo correction changes the results (see `UnitAndCommodityLinker.correct_token`)
+    max_edit_distance = getattr(linker, "max_edit_distance", 0)
+    if max_edit_distance > 0:
+        version += f"-ed{max_edit_distance}"
+    return version
+
+
+def get_files_version(files: list[Path]) -> str:
+    """Get the version of data files from their modification time and size"""
+    versions = []
+    for file in files:
+        try:
+            stat = file.stat()
+            versions.append(f"{stat.st_mtime_ns}-{stat.st_size}")
+        except FileNotFoundError:
+            versions.append("missing")
+    return xxhash.xxh3_64_hexdigest("|".join(versions))
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import gc
+import random
+import resource
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+import orjson
+import typer
+import xxhash
+from minmodkg.entity_linking import Doc, IEntityLinking
+from rdflib import RDF, XSD, BNode, Graph, Literal, URIRef
+from tum.lib.instrument import RSS_UNIT
+from tum.map_mos import MosMapping, mnr, mos
+
+app = typer.Typer(pretty_exceptions_short=True, pretty_exceptions_enable=False)
+
+COUNTRIES = ["United States", "Canada", "Australia", "Chile", "Peru", "Brazil"]
+STATES = ["Nevada", "Arizona", "Alaska", "Ontario", "Quebec", "Queensland"]
+COMMODITIES = ["Copper", "Zinc", "Lead", "Gold", "Silver", "Nickel", "Cobalt"]
+CATEGORIES = ["Measured", "Indicated", "Inferred"]
+TONNAGE_UNITS = ["Mt", "tonnes", "kt"]
+GRADE_UNITS = ["%", "g/t", "ppm"]
+
+
+@dataclass
+class SyntheticConfig:
+    """Shape of a synthetic graph in the simple ontology (MOS)"""
+
+    n_sites: int = 1000
+    inventories_per_site: int = 5
+    # number of categories of an inventory joined by "+" (e.g., Measured+Indicated), split by the mapping
+    category_fanout: int = 2
+    # fraction of the inventories reporting aggregated resource/reserve tonnage instead of per category
+    aggregate_ratio: float = 0.2
+    seed: int = 42
+
+
+@dataclass
+class BenchmarkResult:
+    n_sites: int
+    n_triples: int
+    # time to create MosMapping (indexing the graph), and to map the sites (`MosMapping.__call__`)
+    init_time: float
+    map_time: float
+    sites_per_second: float
+    # peak of memory allocated by python while mapping (bytes)
+    tracemalloc_peak: int
+    # peak resident set size of the process (bytes)
+    peak_rss: int
+
+
+class StubLinker(IEntityLinking):
+    """Linker returning a deterministic entity for each query, so the benchmark measures the mapping
+    instead of the entity linking"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def link(
+        self, query: str, has_props: Optional[dict[str, str]] = None
+    ) -> Optional[tuple[Doc, float]]:
+        ent_id = mnr[f"{self.name}-{xxhash.xxh3_64_hexdigest(query.strip())}"]
+        return Doc(id=str(ent_id), labels=[query], props={}), 1.0
+
+
+def get_stub_linkers() -> dict[str, IEntityLinking]:
+    return {
+        name: StubLinker(name)
+        for name in [
+            "country",
+            "state_or_province",
+            "crs",
+            "category",
+            "unit",
+            "commodity",
+        ]
+    }
+
+
+def make_synthetic_graph(cfg: SyntheticConfig) -> Graph:
+    """Generate a graph of mineral sites in the simple ontology"""
+    rng = random.Random(cfg.seed)
+    g = Graph()
+
+    doc = URIRef("https://minmod.isi.edu/benchmark/document")
+    g.add((doc, RDF.type, mos.Document))
+    g.add((doc, mos.title, Literal("Synthetic benchmark document")))
+    g.add((doc, mos.url, Literal("https://minmod.isi.edu/benchmark/document")))
+
+    for i in range(cfg.n_sites):
+        site = BNode()
+        g.add((site, RDF.type, mos.MineralSite))
+        g.add((site, mos.name, Literal(f"Site {i:07d}")))
+        g.add((site, mos.country, Literal(rng.choice(COUNTRIES))))
+        g.add((site, mos.state_or_province, Literal(rng.choice(STATES))))
+        g.add((site, mos.latitude, Literal(rng.uniform(-60, 70), datatype=XSD.double)))
+        g.add(
+            (site, mos.longitude, Literal(rng.uniform(-180, 180), datatype=XSD.double))
+        )
+
+        for _ in range(cfg.inventories_per_site):
+            inv = BNode()
+            g.add((site, mos.mineral_inventory, inv))
+            g.add((inv, mos.commodity, Literal(rng.choice(COMMODITIES))))
+
+            if rng.random() < cfg.aggregate_ratio:
+                for prefix in ["resource", "reserve"]:
+                    add_measure(g, rng, inv, mos[f"{prefix}_tonnage"], TONNAGE_UNITS)
+                    add_measure(g, rng, inv, mos[f"{prefix}_grade"], GRADE_UNITS)
+            else:
+                add_measure(g, rng, inv, mos.tonnage, TONNAGE_UNITS)
+                add_measure(g, rng, inv, mos.grade, GRADE_UNITS)
+                categories = rng.sample(
+                    CATEGORIES, min(cfg.category_fanout, len(CATEGORIES))
+                )
+                g.add((inv, mos.category, Literal("+".join(categories))))
+    return g
+
+
+def add_measure(
+    g: Graph, rng: random.Random, inv: BNode, prop: URIRef, units: list[str]
+):
+    g.add((inv, prop, Literal(round(rng.uniform(0.01, 100), 3), datatype=XSD.double)))
+    g.add((inv, URIRef(str(prop) + "_unit"), Literal(rng.choice(units))))
+
+
+def benchmark(g: Graph, dup_record_ids: bool = True) -> BenchmarkResult:
+    """Time mapping the graph with the stub linkers"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        mapping = MosMapping(
+            g, "https://minmod.isi.edu/users/s/benchmark", linkers=get_stub_linkers()
+        )
+        init_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sites = mapping(dup_record_ids)
+        map_time = time.perf_counter() - start
+        _, tracemalloc_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        n_sites=len(sites),
+        n_triples=len(g),
+        init_time=init_time,
+        map_time=map_time,
+        sites_per_second=len(sites) / map_time if map_time > 0 else 0.0,
+        tracemalloc_peak=tracemalloc_peak,
+        peak_rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT,
+    )
+
+
+@app.command()
+def main(
+    n_sites: int = typer.Option(1000, help="Number of mineral sites"),
+    inventories_per_site: int = typer.Option(5, help="Number of inventories per site"),
+    category_fanout: int = typer.Option(
+        2,
+        help="Number of categories of an inventory joined by + (e.g., Measured+Indicated)",
+    ),
+    aggregate_ratio: float = typer.Option(
+        0.2, help="Fraction of the inventories with aggregated resource/reserve"
+    ),
+    repeat: int = typer.Option(3, help="Number of runs"),
+    seed: int = typer.Option(42, help="Seed of the synthetic graph"),
+    output: Optional[Path] = typer.Option(
+        None, help="JSON file to write the results (to compare across changes)"
+    ),
+):
+    cfg = SyntheticConfig(
+        n_sites=n_sites,
+        inventories_per_site=inventories_per_site,
+        category_fanout=category_fanout,
+        aggregate_ratio=aggregate_ratio,
+        seed=seed,
+    )
+    g = make_synthetic_graph(cfg)
+    print(f"Generated a graph of {n_sites} sites and {len(g)} triples")
+
+    results = []
+    for i in range(repeat):
+        result = benchmark(g)
+        results.append(result)
+        print(
+            f"Run {i}: init {result.init_time:.3f}s, map {result.map_time:.3f}s, "
+            f"{result.sites_per_second:.1f} sites/s, "
+            f"tracemalloc peak {result.tracemalloc_peak / 2**20:.1f}MB, "
+            f"peak RSS {result.peak_rss / 2**20:.1f}MB"
+        )
+
+    median = statistics.median(r.sites_per_second for r in results)
+    print(f"Median: {median:.1f} sites/s")
+    if output is not None:
+        output.write_bytes(
+            orjson.dumps(
+                {
+                    "config": asdict(cfg),
+                    "runs": [asdict(r) for r in results],
+                    "median_sites_per_second": median,
+                },
+                option=orjson.OPT_INDENT_2,
+            )
+        )
+
+
+if __name__ == "__main__":
+    app()
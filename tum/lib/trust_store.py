@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import fcntl
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, BinaryIO, Iterator, Optional
+
+import orjson
+import serde.json
+from loguru import logger
+
+
+class TrustStore:
+    """Store of records (JSON objects keyed by their `value` field) backed by a JSON file and an
+    append-only journal (`<file>.journal`, one record per line).
+
+    New records are appended to the journal instead of rewriting the JSON file. The journal is merged
+    into the JSON file (compaction) once it grows over `max_journal_size` bytes. All operations hold a
+    lock on `<file>.lock`, so multiple processes can share the store, except reading a store whose lock
+    file cannot be created (e.g., on a read-only mount). When a record is written several times, the
+    last one wins.
+    """
+
+    def __init__(self, file: Path, max_journal_size: int = 1024 * 1024):
+        self.file = file
+        self.journal_file = file.with_name(file.name + ".journal")
+        self.lock_file = file.with_name(file.name + ".lock")
+        self.max_journal_size = max_journal_size
+
+    def load(self) -> dict[str, dict]:
+        with self._lock(exclusive=False):
+            return self._read()
+
+    def append(self, records: list[dict]):
+        """Append the records to the journal, and compact the store if the journal is too large"""
+        if len(records) == 0:
+            return
+        data = b"".join(orjson.dumps(record) + b"\n" for record in records)
+        with self._lock(exclusive=True):
+            with open(self.journal_file, "a+b") as f:
+                drop_partial_record(f)
+                # a single write, so the records of concurrent writers are not interleaved
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                journal_size = f.tell()
+            if journal_size > self.max_journal_size:
+                self._compact()
+
+    def compact(self):
+        """Merge the journal into the JSON file"""
+        with self._lock(exclusive=True):
+            self._compact()
+
+    def _compact(self):
+        # records are only written through the journal, so a process never overwrites the newer records
+        # of other processes with its stale copy of the store
+        value2record = self._read()
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        tmpfile = self.file.with_name(f".{self.file.name}.{uuid.uuid4().hex}.tmp")
+        serde.json.ser(list(value2record.values()), tmpfile, indent=2)
+        os.replace(tmpfile, self.file)
+        # replaying the journal on the compacted file is idempotent, so a crash before this point
+        # does not lose or corrupt records
+        if self.journal_file.exists():
+            os.truncate(self.journal_file, 0)
+
+    def _read(self) -> dict[str, dict]:
+        value2record = {}
+        if self.file.exists():
+            for record in serde.json.deser(self.file):
+                value2record[record["value"]] = record
+        if self.journal_file.exists():
+            with open(self.journal_file, "rb") as f:
+                for line in f:
+                    try:
+                        record = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # a partial line written by a process that crashed
+                        logger.warning(
+                            "Skip a corrupted record in {}", self.journal_file
+                        )
+                        continue
+                    value2record[record["value"]] = record
+        return value2record
+
+    @contextmanager
+    def _lock(self, exclusive: bool) -> Iterator[None]:
+        f = self._open_lock_file(exclusive)
+        if f is None:
+            # the store is on a read-only location (e.g., a data directory mounted read-only), so there
+            # are no writers to wait for
+            yield
+            return
+
+        with f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _open_lock_file(self, exclusive: bool) -> Optional[IO]:
+        """Open the lock file, creating it if needed. A shared lock only needs to read the file, and
+        None is returned if the file cannot be created"""
+        try:
+            self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+            return open(self.lock_file, "a")
+        except OSError:
+            if exclusive:
+                raise
+        try:
+            return open(self.lock_file, "rb")
+        except OSError:
+            return None
+
+
+def drop_partial_record(f: BinaryIO):
+    """Truncate the journal to its last complete record if a process crashed while writing the last
+    one, otherwise the next record would be appended to the partial line and be lost with it
+    """
+    size = f.seek(0, os.SEEK_END)
+    if size == 0:
+        return
+    f.seek(size - 1)
+    if f.read(1) == b"\n":
+        return
+
+    end = 0
+    pos = size
+    while pos > 0:
+        start = max(0, pos - 4096)
+        f.seek(start)
+        i = f.read(pos - start).rfind(b"\n")
+        if i != -1:
+            end = start + i + 1
+            break
+        pos = start
+    logger.warning("Drop a partial record at the end of {}", f.name)
+    f.truncate(end)
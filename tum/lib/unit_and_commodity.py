@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+import threading
 from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
 
 import orjson
-import serde.json
 from minmodkg.entity_linking import Doc, EntityLinking, IEntityLinking
 from sm.misc.funcs import assert_not_null
-from symspellpy import SymSpell
+from symspellpy import SymSpell, Verbosity
 from tum.config import CRITICAL_MAAS_DIR
+from tum.lib.linker_index import count_symspell_words, get_loaded_index
+from tum.lib.trust_store import TrustStore
 from tum.namespace import MNO_NS, MNR_NS
 
 
@@ -86,12 +89,26 @@ class UnitAndCommodityLinkingResult:
         return obj
 
 
+# protect the creation of the shared instances of the linkers
+_instance_lock = threading.Lock()
+# shorter tokens are not corrected, as they are close to too many labels (e.g., kt and Mt, ppb and ppm)
+MIN_CORRECTED_TOKEN_LENGTH = 4
+
+
 class UnitAndCommodityLinker:
 
-    instance = None
+    # the shared instances by their maximum edit distances
+    instances: dict[int, UnitAndCommodityLinker] = {}
 
-    def __init__(self, entity_dir: Path | str):
+    def __init__(self, entity_dir: Path | str, max_edit_distance: int = 0):
+        """
+        Args:
+            entity_dir: directory of the predefined entities
+            max_edit_distance: maximum edit distance to correct the tokens with typos (e.g., OCR
+                errors) to the labels of the entities before linking them, 0 to disable the correction
+        """
         self.entity_dir = Path(entity_dir)
+        self.max_edit_distance = max_edit_distance
         self.unit_linker = EntityLinking.get_instance(entity_dir, "unit")
         self.commodity_linker = EntityLinking.get_instance(entity_dir, "commodity")
         self.commodity_form_linker = EntityLinking.get_instance(
@@ -103,26 +120,92 @@ class UnitAndCommodityLinker:
             "commodity": self.commodity_linker,
             "commodity_form": self.commodity_form_linker,
         }
-
-        # create dictionary
-        self.symspell = SymSpell(max_dictionary_edit_distance=0, prefix_length=7)
-        for linker in self.linkers.values():
+        # token -> corrected tokens
+        self.token_corrections: dict[str, list[str]] = {}
+        self._build_lock = threading.Lock()
+
+    @cached_property
+    def symspell(self) -> SymSpell:
+        """Dictionary of the labels of the entities, only built if the correction is enabled"""
+        with self._build_lock:
+            # built by another thread while waiting for the lock
+            if "symspell" in self.__dict__:
+                return self.__dict__["symspell"]
+
+            # reuse the word counts of the linker index if it is loaded
+            index = get_loaded_index(self.entity_dir)
+            if index is not None:
+                words = index.symspell_words
+            else:
+                words = count_symspell_words(self.linkers.values())
+            symspell = SymSpell(
+                max_dictionary_edit_distance=self.max_edit_distance, prefix_length=7
+            )
+            for word, count in words.items():
+                symspell.create_dictionary_entry(word, count)
+            return symspell
+
+    @cached_property
+    def label2link(self) -> dict[str, Optional[tuple[str, Doc, float]]]:
+        """Label -> (linker's name, entity, score) of the labels of the entities, None if the label
+        belongs to multiple entities"""
+        label2link = {}
+        for lname, linker in self.linkers.items():
             for doc in linker.docs:
                 for label in doc.labels:
-                    if label == "":
-                        continue
-                    self.symspell.create_dictionary_entry(label, 2)
+                    if label not in label2link:
+                        label2link[label] = (lname, doc, 1.0)
+                    elif (
+                        label2link[label] is not None
+                        and label2link[label][1] is not doc
+                    ):
+                        label2link[label] = None
+        return label2link
 
     @staticmethod
-    def get_instance(entity_dir: Path | str):
-        if UnitAndCommodityLinker.instance is None:
-            UnitAndCommodityLinker.instance = UnitAndCommodityLinker(entity_dir)
-
-        assert UnitAndCommodityLinker.instance.entity_dir == Path(entity_dir)
-        return UnitAndCommodityLinker.instance
+    def get_instance(entity_dir: Path | str, max_edit_distance: int = 0):
+        """Get the shared linker of the maximum edit distance, created on the first call"""
+        instances = UnitAndCommodityLinker.instances
+        if max_edit_distance not in instances:
+            with _instance_lock:
+                if max_edit_distance not in instances:
+                    instances[max_edit_distance] = UnitAndCommodityLinker(
+                        entity_dir, max_edit_distance
+                    )
+
+        linker = instances[max_edit_distance]
+        if linker.entity_dir != Path(entity_dir):
+            raise ValueError(
+                f"The shared linker uses the entities in {linker.entity_dir}, not {entity_dir}"
+            )
+        return linker
 
     def link(self, text: str) -> UnitAndCommodityLinkingResult:
-        origin_text = text
+        tokens = self.tokenize(text)
+        return self.make_result(
+            text, tokens, {token: self.link_token(token) for token in tokens}
+        )
+
+    def link_many(self, texts: Sequence[str]) -> list[UnitAndCommodityLinkingResult]:
+        """Link a batch of texts, returning the results in the same order.
+
+        The texts and their tokens are deduplicated across the batch, so each distinct token is
+        linked only once. Duplicated texts share the same result object.
+        """
+        text2tokens = {text: self.tokenize(text) for text in texts}
+        token2link = {}
+        for tokens in text2tokens.values():
+            for token in tokens:
+                if token not in token2link:
+                    token2link[token] = self.link_token(token)
+
+        text2result = {
+            text: self.make_result(text, tokens, token2link)
+            for text, tokens in text2tokens.items()
+        }
+        return [text2result[text] for text in texts]
+
+    def tokenize(self, text: str) -> list[str]:
         if text.find(" ") == -1:
             # heuristics to split cases like "%Pb" to "% Pb"
             # symspell fails to correct %Pb, this is weird
@@ -133,16 +216,87 @@ class UnitAndCommodityLinker:
             # text = self.symspell.word_segmentation(text).corrected_string
 
         tokens = text.split(" ")
-        out = UnitAndCommodityLinkingResult(origin_text)
+        if self.max_edit_distance > 0:
+            tokens = [
+                corrected for token in tokens for corrected in self.correct_token(token)
+            ]
+        return tokens
+
+    def correct_token(self, token: str) -> list[str]:
+        """Split a token into labels of the entities if it is a concatenation of labels (e.g., g/tAu),
+        or correct it to a label within the maximum edit distance. The corrections are cached.
+
+        To avoid linking a token to a wrong entity, a token that is a label is never corrected, and a
+        token is only corrected if it has at least `MIN_CORRECTED_TOKEN_LENGTH` characters and a
+        single closest label.
+        """
+        if token in self.token_corrections:
+            return self.token_corrections[token]
+
+        corrected = [token]
+        if token != "" and token not in self.label2link:
+            words = self.segment_token(token)
+            if words is not None:
+                corrected = words
+            elif len(token) >= MIN_CORRECTED_TOKEN_LENGTH:
+                suggestions = self.symspell.lookup(
+                    token, Verbosity.CLOSEST, max_edit_distance=self.max_edit_distance
+                )
+                if len(suggestions) == 1:
+                    corrected = [suggestions[0].term]
+
+        self.token_corrections[token] = corrected
+        return corrected
+
+    def segment_token(self, token: str) -> Optional[list[str]]:
+        """Split a token into the fewest labels of the entities, None if it is not a concatenation of
+        labels. Unlike `SymSpell.word_segmentation`, the labels must match exactly (including the case)
+        """
+        # splits[i] is the fewest labels of token[:i]
+        splits: list[Optional[list[str]]] = [[]] + [None] * len(token)
+        for i in range(1, len(token) + 1):
+            for j in range(i):
+                prev_split = splits[j]
+                current_split = splits[i]
+                if (
+                    prev_split is not None
+                    and token[j:i] in self.label2link
+                    and (
+                        current_split is None
+                        or len(prev_split) + 1 < len(current_split)
+                    )
+                ):
+                    splits[i] = prev_split + [token[j:i]]
+        return splits[-1]
+
+    def link_token(self, token: str) -> tuple[str, Doc, float]:
+        """Link a token to the best entity of the linkers, return the linker's name, the entity, and the score"""
+        if self.max_edit_distance > 0:
+            # the tokens are corrected to the labels, and a label of exactly one entity gets the
+            # maximum score from the linkers, skip scoring
+            link = self.label2link.get(token)
+            if link is not None:
+                return link
+
+        lname, (doc, score) = max(
+            [
+                (lname, assert_not_null(linker.link(token)))
+                for lname, linker in self.linkers.items()
+            ],
+            key=lambda x: x[1][1],
+        )
+        return lname, doc, score
+
+    def make_result(
+        self,
+        text: str,
+        tokens: list[str],
+        token2link: dict[str, tuple[str, Doc, float]],
+    ) -> UnitAndCommodityLinkingResult:
+        out = UnitAndCommodityLinkingResult(text)
 
         for token in tokens:
-            lname, (doc, score) = max(
-                [
-                    (lname, assert_not_null(linker.link(token)))
-                    for lname, linker in self.linkers.items()
-                ],
-                key=lambda x: x[1][1],
-            )
+            lname, doc, score = token2link[token]
             if lname == "unit":
                 out.unit_observed_value = token
                 out.unit = doc.id
@@ -166,41 +320,101 @@ class UnitAndCommodityLinker:
 
 
 class UnitAndCommodityTrustedLinker(UnitAndCommodityLinker):
-    instance = None
-
-    def __init__(self, entity_dir: Path | str, trust_file: Path | str):
-        super().__init__(entity_dir)
+    """Linker returning the trusted linking results of the texts.
+
+    The linker can be shared between threads: the trusted results are read without locking, and new
+    links are added under a lock. The new links of concurrent threads are written to the trust file
+    in batches, see `flush`.
+    """
+
+    # the shared instances by their maximum edit distances
+    instances: dict[int, UnitAndCommodityTrustedLinker] = {}
+
+    def __init__(
+        self,
+        entity_dir: Path | str,
+        trust_file: Path | str,
+        max_edit_distance: int = 0,
+    ):
+        super().__init__(entity_dir, max_edit_distance)
         self.trust_file = Path(trust_file)
+        self.trust_store = TrustStore(self.trust_file)
+        self.journal_file = self.trust_store.journal_file
         self.text2linking_result = self.load_trust_file()
 
+        # protect the updates of text2linking_result and the pending links
+        self._write_lock = threading.Lock()
+        # serialize the writes to the trust file
+        self._flush_lock = threading.Lock()
+        self._pending_links: list[UnitAndCommodityLinkingResult] = []
+
     @staticmethod
-    def get_instance(entity_dir: Path | str, trust_file: Path | str):
-        if UnitAndCommodityTrustedLinker.instance is None:
-            UnitAndCommodityTrustedLinker.instance = UnitAndCommodityTrustedLinker(
-                entity_dir, trust_file
+    def get_instance(
+        entity_dir: Path | str, trust_file: Path | str, max_edit_distance: int = 0
+    ):
+        """Get the shared linker of the maximum edit distance, created on the first call"""
+        instances = UnitAndCommodityTrustedLinker.instances
+        if max_edit_distance not in instances:
+            with _instance_lock:
+                if max_edit_distance not in instances:
+                    instances[max_edit_distance] = UnitAndCommodityTrustedLinker(
+                        entity_dir, trust_file, max_edit_distance
+                    )
+
+        linker = instances[max_edit_distance]
+        if linker.entity_dir != Path(entity_dir) or linker.trust_file != Path(
+            trust_file
+        ):
+            raise ValueError(
+                f"The shared linker uses the entities in {linker.entity_dir} and the trusted links "
+                f"in {linker.trust_file}, not {entity_dir} and {trust_file}"
             )
-
-        assert UnitAndCommodityTrustedLinker.instance.entity_dir == Path(entity_dir)
-        assert UnitAndCommodityTrustedLinker.instance.trust_file == Path(trust_file)
-        return UnitAndCommodityTrustedLinker.instance
+        return linker
 
     def link(
         self, text: str, must_be_in_trusted: bool = True, save_link: bool = False
     ) -> UnitAndCommodityLinkingResult:
-        if text in self.text2linking_result:
-            return self.text2linking_result[text]
+        res = self.text2linking_result.get(text)
+        if res is not None:
+            return res
         if must_be_in_trusted:
             raise ValueError(f"{text} is not in trusted linking results")
         res = super().link(text)
         if save_link:
-            self.text2linking_result[text] = res
-            self.save_trust_file()
+            res = self.add_links({text: res})[text]
         return res
 
+    def link_many(
+        self,
+        texts: Sequence[str],
+        must_be_in_trusted: bool = True,
+        save_link: bool = False,
+    ) -> list[UnitAndCommodityLinkingResult]:
+        """Link a batch of texts, only the distinct texts that are not in the trusted results are
+        linked (see `UnitAndCommodityLinker.link_many`), and the new links are saved at once
+        """
+        missing_texts = [
+            text
+            for text in dict.fromkeys(texts)
+            if text not in self.text2linking_result
+        ]
+        if len(missing_texts) > 0 and must_be_in_trusted:
+            raise ValueError(f"{missing_texts[0]} is not in trusted linking results")
+
+        text2result = dict(zip(missing_texts, super().link_many(missing_texts)))
+        if save_link and len(missing_texts) > 0:
+            text2result = self.add_links(text2result)
+        return [
+            (
+                self.text2linking_result[text]
+                if text in self.text2linking_result
+                else text2result[text]
+            )
+            for text in texts
+        ]
+
     def load_trust_file(self):
-        if not self.trust_file.exists():
-            return {}
-        linked_results = serde.json.deser(self.trust_file)
+        linked_results = self.trust_store.load().values()
         return {
             result["value"]: UnitAndCommodityLinkingResult(
                 value=result["value"],
@@ -217,12 +431,42 @@ class UnitAndCommodityTrustedLinker(UnitAndCommodityLinker):
             for result in linked_results
         }
 
+    def add_links(
+        self, text2result: dict[str, UnitAndCommodityLinkingResult]
+    ) -> dict[str, UnitAndCommodityLinkingResult]:
+        """Add new links to the trusted results and save them. If a text has been linked by another
+        thread in the meantime, its existing result is kept and returned instead."""
+        with self._write_lock:
+            for text, res in text2result.items():
+                if text not in self.text2linking_result:
+                    self.text2linking_result[text] = res
+                    self._pending_links.append(res)
+            text2result = {text: self.text2linking_result[text] for text in text2result}
+        self.flush()
+        return text2result
+
+    def flush(self):
+        """Save the pending links. While a thread is writing, the links of the other threads are
+        queued and written by the next thread in one batch, so each call returns after the links
+        added before it are saved."""
+        with self._flush_lock:
+            with self._write_lock:
+                results, self._pending_links = self._pending_links, []
+            if len(results) > 0:
+                self.save_links(results)
+
+    def save_links(self, results: list[UnitAndCommodityLinkingResult]):
+        """Append the new links to the journal of the trust file"""
+        self.trust_store.append([res.to_dict(self) for res in results])
+
     def save_trust_file(self):
-        serde.json.ser(
-            [res.to_dict(self) for res in self.text2linking_result.values()],
-            self.trust_file,
-            indent=2,
-        )
+        """Rewrite the trust file with all links, including the ones saved by other processes.
+
+        Only the links added by this process are written (to the journal, see `flush`), the other links
+        may be stale copies of links updated by other processes since the trust file was loaded.
+        """
+        self.flush()
+        self.trust_store.compact()
 
 
 class UnitCompatibleLinker(IEntityLinking):
@@ -387,5 +631,7 @@ if __name__ == "__main__":
         # "Ni",
         "PGE"
     ]
-    for ex in examples:
-        linker.link(ex, must_be_in_trusted=False, save_link=save_link).explain(linker)
+    for res in linker.link_many(
+        examples, must_be_in_trusted=False, save_link=save_link
+    ):
+        res.explain(linker)
@@ -1,16 +1,16 @@
 import os
 from collections import defaultdict
-from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import cache, partial
 from io import StringIO
 from pathlib import Path
-from typing import cast
+from typing import Iterable, Iterator, Optional, Sequence, cast
 
 import orjson
 from drepr.models.prelude import DRepr
 from kgdata.dataset import Dataset
 from kgdata.db import (
     GenericDB,
-    build_database,
     deser_from_dict,
     deser_from_tuple,
     ser_to_dict,
@@ -21,7 +21,6 @@ from kgdata.dbpedia.datasets.ontology_dump import aggregated_triples
 from kgdata.misc.resource import RDFResource, assert_not_bnode
 from kgdata.models.entity import Entity, EntityLabel, EntityMetadata, Statement
 from kgdata.models.multilingual import MultiLingualString, MultiLingualStringList
-from kgdata.spark.extended_rdd import ExtendedRDD
 from minmodkg.models.kg.base import NS_MO
 from rdflib import RDFS, SKOS, Graph
 from tum.config import (
@@ -33,6 +32,13 @@ from tum.config import (
     ONTOLOGY_FILE,
 )
 from tum.db import MNDRDB
+from tum.lib.incremental_db import (
+    Backend,
+    build_partitioned_dataset,
+    iter_partition,
+    sort_by_size,
+    update_database,
+)
 
 from statickg.main import ETLPipelineRunner
 from statickg.models.etl import ETLOutput
@@ -59,7 +65,95 @@ def get_rdf_resources(ttl_file: Path) -> list[RDFResource]:
     return resources
 
 
-def entities(project: str):
+def get_rdf_resources_parallel(
+    ttl_files: Sequence[Path], workers: Optional[int] = None
+) -> Iterator[tuple[Path, list[RDFResource]]]:
+    """Parse the TTL files with a pool of processes, yield the resources of each file (a partition)
+    as soon as the file is parsed. The largest files are submitted first so they do not delay the end
+    of the stage."""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(get_rdf_resources, ttl_file): ttl_file
+            for ttl_file in sort_by_size(ttl_files)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def iter_serialized_entities(ttl_file: str) -> Iterator[bytes]:
+    """Parse the entities of a TTL file and serialize them one by one"""
+    for resource in get_rdf_resources(Path(ttl_file)):
+        yield orjson.dumps(to_entity(resource).to_dict())
+
+
+def build_entity_partitions(
+    ttl_files: Sequence[str], workers: Optional[int] = None
+) -> Iterator[tuple[str, Iterable[bytes]]]:
+    """Same records as `iter_serialized_entities`, but the TTL files are parsed in parallel by
+    `get_rdf_resources_parallel` and each file is serialized once it is parsed"""
+    for ttl_file, resources in get_rdf_resources_parallel(
+        [Path(file) for file in ttl_files], workers
+    ):
+        yield str(ttl_file), (
+            orjson.dumps(to_entity(resource).to_dict()) for resource in resources
+        )
+
+
+def to_entity(resource: RDFResource) -> Entity:
+    (label,) = resource.props.pop(str(RDFS.label))
+    (description,) = resource.props.pop(str(RDFS.comment), [""])
+    aliases = [
+        str(x)
+        for x in resource.props.pop(str(SKOS.altLabel), [])
+        + resource.props.pop(NS_MO.uristr("aliases"), [])
+    ]
+
+    return Entity(
+        id=resource.id,
+        label=MultiLingualString.en(str(label)),
+        description=MultiLingualString.en(description),
+        aliases=MultiLingualStringList({"en": aliases}, "en"),
+        props={
+            pid: [Statement(assert_not_bnode(value), {}, []) for value in values]
+            for pid, values in resource.props.items()
+        },
+    )
+
+
+def get_entity_ttl_files(args: DReprServiceInvokeArgs) -> list[Path]:
+    return [
+        dpath
+        for dpath in args["output"].get_path().iterdir()
+        if dpath.suffix == ".ttl" and dpath.stem not in ["data_source"]
+    ]
+
+
+def iter_serialized_classes(ontology_file: str) -> Iterator[bytes]:
+    classes, _, _ = MNDRDB.parse_ontology(Path(ontology_file))
+    for e in classes.values():
+        yield orjson.dumps(e.to_dict())
+
+
+def iter_serialized_props(ontology_file: str) -> Iterator[bytes]:
+    _, props, _ = MNDRDB.parse_ontology(Path(ontology_file))
+    for e in props.values():
+        yield orjson.dumps(e.to_dict())
+
+
+def iter_serialized_entity_labels(entity_file: str) -> Iterator[bytes]:
+    for record in iter_partition(entity_file):
+        ent = deser_from_dict(Entity, record)
+        yield ser_to_dict(EntityLabel(ent.id, str(ent.label)))
+
+
+def iter_serialized_entity_metadata(entity_file: str) -> Iterator[bytes]:
+    for record in iter_partition(entity_file):
+        yield ser_to_tuple(convert_to_entity_metadata(deser_from_dict(Entity, record)))
+
+
+# the entities are the dependency of other datasets, so they are only checked for changes once
+@cache
+def entities(project: str, backend: Backend = "spark"):
     ds = Dataset(
         DATA_DIR / project / "entities/*.gz",
         deserialize=partial(deser_from_dict, Entity),
@@ -67,122 +161,79 @@ def entities(project: str):
         dependencies=[],
     )
 
-    if not ds.has_complete_data():
-        # execute task that generates entities
-        (task,) = [
-            task
-            for task in kgbuilder.etl.pipeline
-            if task.service == "kgrel.data.entities"
-        ]
-        args: DReprServiceInvokeArgs = cast(DReprServiceInvokeArgs, task.args)
-        kgbuilder.services[task.service](kgbuilder.repo, args, ETLOutput())
-
-        entities = []
-        for dpath in args["output"].get_path().iterdir():
-            if dpath.suffix != ".ttl" or dpath.stem in ["data_source"]:
-                continue
-            for resource in get_rdf_resources(dpath):
-                (label,) = resource.props.pop(str(RDFS.label))
-                (description,) = resource.props.pop(str(RDFS.comment), [""])
-                aliases = [
-                    str(x)
-                    for x in resource.props.pop(str(SKOS.altLabel), [])
-                    + resource.props.pop(NS_MO.uristr("aliases"), [])
-                ]
-
-                entities.append(
-                    Entity(
-                        id=resource.id,
-                        label=MultiLingualString.en(str(label)),
-                        description=MultiLingualString.en(description),
-                        aliases=MultiLingualStringList({"en": aliases}, "en"),
-                        props={
-                            pid: [
-                                Statement(assert_not_bnode(value), {}, [])
-                                for value in values
-                            ]
-                            for pid, values in resource.props.items()
-                        },
-                    )
-                )
-        entities = [orjson.dumps(e.to_dict()) for e in entities]
-        ExtendedRDD.parallelize(entities).save_like_dataset(
-            ds, trust_dataset_dependencies=True
-        )
-
+    # execute task that generates entities, the service only converts the modified data files
+    (task,) = [
+        task for task in kgbuilder.etl.pipeline if task.service == "kgrel.data.entities"
+    ]
+    args: DReprServiceInvokeArgs = cast(DReprServiceInvokeArgs, task.args)
+    kgbuilder.services[task.service](kgbuilder.repo, args, ETLOutput())
+
+    # each TTL file is parsed by a worker and written to its own partition, and only the partitions
+    # of the modified files are rebuilt. Outside of spark, the files are parsed largest first.
+    build_partitioned_dataset(
+        ds,
+        get_entity_ttl_files(args),
+        iter_serialized_entities,
+        backend,
+        build_partitions=build_entity_partitions,
+    )
     return ds
 
 
-def classes(project: str):
+def classes(project: str, backend: Backend = "spark"):
     ds = Dataset(
         DATA_DIR / project / "classes/*.gz",
         deserialize=partial(deser_from_dict, Entity),
         name="classes",
         dependencies=[],
     )
-
-    if not ds.has_complete_data():
-        classes, props, _ = MNDRDB.parse_ontology(ONTOLOGY_FILE)
-        classes = [orjson.dumps(e.to_dict()) for e in classes.values()]
-        ExtendedRDD.parallelize(classes).save_like_dataset(
-            ds, trust_dataset_dependencies=True
-        )
-
+    build_partitioned_dataset(ds, [ONTOLOGY_FILE], iter_serialized_classes, backend)
     return ds
 
 
-def props(project: str):
+def props(project: str, backend: Backend = "spark"):
     ds = Dataset(
         DATA_DIR / project / "props/*.gz",
         deserialize=partial(deser_from_dict, Entity),
         name="props",
         dependencies=[],
     )
-
-    if not ds.has_complete_data():
-        classes, props, _ = MNDRDB.parse_ontology(ONTOLOGY_FILE)
-        props = [orjson.dumps(e.to_dict()) for e in props.values()]
-        ExtendedRDD.parallelize(props).save_like_dataset(
-            ds, trust_dataset_dependencies=True
-        )
+    build_partitioned_dataset(ds, [ONTOLOGY_FILE], iter_serialized_props, backend)
     return ds
 
 
-def entity_labels(project: str) -> Dataset[EntityLabel]:
+def entity_labels(project: str, backend: Backend = "spark") -> Dataset[EntityLabel]:
     ds = Dataset(
         DATA_DIR / project / "entity_labels/*.gz",
         deserialize=partial(deser_from_dict, EntityLabel),
         name="entity-labels",
-        dependencies=[entities(project)],
+        dependencies=[entities(project, backend)],
+    )
+    # one partition per partition of the entities, so only the modified ones are rebuilt
+    build_partitioned_dataset(
+        ds,
+        [Path(file) for file in entities(project, backend).get_files()],
+        iter_serialized_entity_labels,
+        backend,
     )
-
-    if not ds.has_complete_data():
-        (
-            entities(project)
-            .get_extended_rdd()
-            .map(lambda ent: EntityLabel(ent.id, str(ent.label)))
-            .map(ser_to_dict)
-            .save_like_dataset(ds, auto_coalesce=True, shuffle=True)
-        )
     return ds
 
 
-def entity_metadata(project: str) -> Dataset[EntityMetadata]:
+def entity_metadata(
+    project: str, backend: Backend = "spark"
+) -> Dataset[EntityMetadata]:
     ds = Dataset(
         DATA_DIR / project / "entity_metadata/*.gz",
         deserialize=partial(deser_from_tuple, EntityMetadata),
         name="entity-metadata",
-        dependencies=[entities(project)],
+        dependencies=[entities(project, backend)],
+    )
+    build_partitioned_dataset(
+        ds,
+        [Path(file) for file in entities(project, backend).get_files()],
+        iter_serialized_entity_metadata,
+        backend,
     )
-
-    if not ds.has_complete_data():
-        (
-            entities(project)
-            .get_extended_rdd()
-            .map(convert_to_entity_metadata)
-            .map(ser_to_tuple)
-            .save_like_dataset(ds, auto_coalesce=True, shuffle=True)
-        )
     return ds
 
 
@@ -199,7 +250,13 @@ if __name__ == "__main__":
     app = typer.Typer(pretty_exceptions_short=True, pretty_exceptions_enable=False)
 
     @app.command(help="Builds the database")
-    def cli(project: str = "minmod"):
+    def cli(
+        project: str = "minmod",
+        backend: Backend = typer.Option(
+            "spark",
+            help="Build the datasets with spark, or with a pool of processes (local) for small projects",
+        ),
+    ):
         (DATA_DIR / project).mkdir(parents=True, exist_ok=True)
 
         if project == "minmod":
@@ -217,8 +274,8 @@ if __name__ == "__main__":
                     "is_sorted": False,
                 }
 
-            build_database(
-                globals()[ds](project),
+            update_database(
+                globals()[ds](project, backend),
                 lambda: getattr(
                     GenericDB(DATA_DIR / project / "databases", read_only=False), ds
                 ),
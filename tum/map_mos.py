@@ -2,94 +2,366 @@ from __future__ import annotations
 
 import datetime
 import glob
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from decimal import Decimal
+from enum import Enum
 from io import StringIO
 from pathlib import Path
-from typing import Literal, Optional
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Literal, Optional
+from urllib.parse import urlparse
 
-import httpx
+import orjson
 import rdflib.term
 import serde.json
 import typer
+import xxhash
 from minmodkg.entity_linking import EntityLinking, IEntityLinking
 from rdflib import RDF, RDFS, XSD, Graph, Namespace, URIRef
+from serde.helper import orjson_dumps
 from slugify import slugify
 from sm.misc.funcs import assert_isinstance
 from tqdm.auto import tqdm
-from tum.config import CRITICAL_MAAS_DIR, DATA_DIR
+from tum.config import CRITICAL_MAAS_DIR, DATA_DIR, HTTP_CACHE_DIR
+from tum.lib.linker_index import load_linker_index
+from tum.lib.linking_cache import LinkingCache, get_files_version
 from tum.lib.unit_and_commodity import (
     CommodityCompatibleLinker,
     UnitAndCommodityTrustedLinker,
     UnitCompatibleLinker,
 )
 
+if TYPE_CHECKING:
+    from tum.lib.http_cache import HttpCache
+
 mos = Namespace("https://minmod.isi.edu/ontology-simple/")
 mnr = Namespace("https://minmod.isi.edu/resource/")
 app = typer.Typer(pretty_exceptions_short=True, pretty_exceptions_enable=False)
 JsonValue = str | int | float | bool
 
 
+class OutputFormat(str, Enum):
+    json = "json"
+    compact = "compact"
+    ndjson = "ndjson"
+
+    @property
+    def ext(self) -> str:
+        return ".ndjson" if self == OutputFormat.ndjson else ".json"
+
+
+# bump this version when the mapping changes to invalidate the fingerprints of the mapped records
+MOS_MAPPING_VERSION = 100
+# data files of the predefined entity linkers
+PREDEFINED_ENTITY_DIR = CRITICAL_MAAS_DIR / "kgdata/data/entities"
+TRUSTED_LINKS_FILE = DATA_DIR / "minmod/units_and_commodities.json"
+# protect the creation of the shared entity linkers (see `MosMapping.get_predefined_linkers`)
+_linkers_lock = threading.Lock()
+EMPTY_PROPS: dict = {}
+EMPTY_OBJECTS: list = []
+
+
+@dataclass
+class MosDelta:
+    """Changes of the mapped sites of a graph compared to its previous mapping"""
+
+    added: list[dict] = field(default_factory=list)
+    changed: list[dict] = field(default_factory=list)
+    # record ids of the removed sites
+    removed: list[str] = field(default_factory=list)
+    # sites of the previous mapping that have not changed
+    unchanged: list[dict] = field(default_factory=list)
+    # record id -> fingerprint of the current records (see `MosMapping.get_record_fingerprints`)
+    fingerprints: dict[str, str] = field(default_factory=dict)
+
+    def get_sites(self) -> list[dict]:
+        """Get all the current sites, sorted by their names"""
+        return sorted(
+            self.added + self.changed + self.unchanged,
+            key=lambda site: (site["name"], site["record_id"]),
+        )
+
+    def to_dict(self) -> dict:
+        return {"added": self.added, "changed": self.changed, "removed": self.removed}
+
+
 class MosMapping:
     """Mapping from the simple ontology to the full ontology"""
 
-    def __init__(self, g: Graph, created_by: str):
+    def __init__(
+        self,
+        g: Graph,
+        created_by: str,
+        linking_cache: Optional[LinkingCache] = None,
+        linkers: Optional[dict[str, IEntityLinking]] = None,
+        max_edit_distance: int = 0,
+    ):
+        """
+        Args:
+            g: the graph in the simple ontology
+            created_by: the creator of the mapped sites
+            linking_cache: cache of the entity linking results
+            linkers: the entity linkers by name (country, state_or_province, crs, category, unit,
+                commodity), default to the linkers of the predefined entities
+            max_edit_distance: maximum edit distance to correct the typos of the units and commodities
+                with the predefined linkers (see `UnitAndCommodityLinker`), 0 to disable the correction
+        """
         self.g = g
-
-        predefined_ent_dir = CRITICAL_MAAS_DIR / "kgdata/data/entities"
-
-        self.country_linker = EntityLinking.get_instance(predefined_ent_dir, "country")
-        self.state_or_province_linker = EntityLinking.get_instance(
-            predefined_ent_dir, "state_or_province"
+        # subject -> predicate -> objects, built in one pass over the graph so that the lookups
+        # of the mapping do not go through the rdflib store. The graph must not be modified afterward.
+        self.index: dict[
+            rdflib.term.Node, dict[rdflib.term.Node, list[rdflib.term.Node]]
+        ] = {}
+        # class -> instances
+        self.instances: dict[rdflib.term.Node, list[rdflib.term.Node]] = {}
+        # objects of `mos:source_id`, the reference of the sites when there is no document
+        self.source_ids: list[rdflib.term.Node] = []
+        for subj, prop, obj in g:
+            self.index.setdefault(subj, {}).setdefault(prop, []).append(obj)
+            if prop == RDF.type:
+                self.instances.setdefault(obj, []).append(subj)
+            elif prop == mos.source_id:
+                self.source_ids.append(obj)
+
+        # the same values (e.g., country, unit) repeat across rows, so the linking results are cached
+        # for the mapping run, or across runs if a persistent cache is provided
+        self.linking_cache = linking_cache or LinkingCache()
+        if linkers is None:
+            linkers = MosMapping.get_predefined_linkers(max_edit_distance)
+        self.country_linker = self.linking_cache.wrap("country", linkers["country"])
+        self.state_or_province_linker = self.linking_cache.wrap(
+            "state_or_province", linkers["state_or_province"]
         )
-        self.crs_linker = EntityLinking.get_instance(predefined_ent_dir, "crs")
-        self.category_linker = EntityLinking.get_instance(
-            predefined_ent_dir, "category"
+        self.crs_linker = self.linking_cache.wrap("crs", linkers["crs"])
+        self.category_linker = self.linking_cache.wrap("category", linkers["category"])
+        self.unit_linker = self.linking_cache.wrap("unit", linkers["unit"])
+        self.commodity_linker = self.linking_cache.wrap(
+            "commodity", linkers["commodity"]
         )
-        self.unit_commodity_linker = UnitAndCommodityTrustedLinker.get_instance(
-            predefined_ent_dir,
-            DATA_DIR / "minmod/units_and_commodities.json",
+        self.created_by = created_by
+
+    @staticmethod
+    def get_predefined_linkers(max_edit_distance: int = 0) -> dict[str, IEntityLinking]:
+        predefined_ent_dir = PREDEFINED_ENTITY_DIR
+        # the linkers are shared singletons, they are created once even if MosMapping is created
+        # from multiple threads (e.g., concurrent exports in SAND)
+        with _linkers_lock:
+            # use the prebuilt linkers if available, it is much faster than parsing the entity files
+            load_linker_index(predefined_ent_dir)
+
+            unit_commodity_linker = UnitAndCommodityTrustedLinker.get_instance(
+                predefined_ent_dir,
+                TRUSTED_LINKS_FILE,
+                max_edit_distance,
+            )
+            return {
+                "country": EntityLinking.get_instance(predefined_ent_dir, "country"),
+                "state_or_province": EntityLinking.get_instance(
+                    predefined_ent_dir, "state_or_province"
+                ),
+                "crs": EntityLinking.get_instance(predefined_ent_dir, "crs"),
+                "category": EntityLinking.get_instance(predefined_ent_dir, "category"),
+                "unit": UnitCompatibleLinker(unit_commodity_linker),
+                "commodity": CommodityCompatibleLinker(unit_commodity_linker),
+            }
+
+    @staticmethod
+    def get_predefined_linkers_version() -> str:
+        """Version of the predefined linkers from their data files (the entities and the trusted
+        links), computed without creating the linkers"""
+        return get_files_version(
+            sorted(PREDEFINED_ENTITY_DIR.glob("*.ttl"))
+            + [
+                TRUSTED_LINKS_FILE,
+                TRUSTED_LINKS_FILE.with_name(TRUSTED_LINKS_FILE.name + ".journal"),
+            ]
         )
 
-        self.unit_linker = UnitCompatibleLinker(self.unit_commodity_linker)
-        self.commodity_linker = CommodityCompatibleLinker(self.unit_commodity_linker)
-        self.created_by = created_by
+    @staticmethod
+    def map(
+        infile: str,
+        dup_record_ids: bool,
+        created_by: str,
+        linking_cache: Optional[LinkingCache] = None,
+        stream: bool = False,
+        http_cache: Optional[HttpCache] = None,
+        max_edit_distance: int = 0,
+    ) -> list | Iterator[dict]:
+        g = MosMapping.load_graph(infile, http_cache)
+        return MosMapping.map_graph(
+            g, dup_record_ids, created_by, linking_cache, stream, max_edit_distance
+        )
 
     @staticmethod
-    def map(infile: str, dup_record_ids: bool, created_by: str) -> list:
+    def load_graph(infile: str, http_cache: Optional[HttpCache] = None) -> Graph:
         g = Graph()
         if infile.startswith("http://") or infile.startswith("https://"):
             # this is a URI
-            g.parse(
-                data=httpx.get(infile).raise_for_status().content.decode(),
-                format="turtle",
-            )
+            from tum.lib.http_cache import HttpCache
+
+            if http_cache is None:
+                http_cache = HttpCache(HTTP_CACHE_DIR)
+            g.parse(data=http_cache.fetch(infile).decode(), format="turtle")
         else:
             g.parse(location=infile, format="turtle")
-        return MosMapping(g, created_by)(dup_record_ids)
+        return g
+
+    @staticmethod
+    def map_urls(
+        urls: list[str],
+        dup_record_ids: bool,
+        created_by: str,
+        linking_cache: Optional[LinkingCache] = None,
+        stream: bool = False,
+        http_cache: Optional[HttpCache] = None,
+        max_edit_distance: int = 0,
+    ) -> Iterator[tuple[str, list | Iterator[dict]]]:
+        """Fetch the TTL files at the URLs concurrently through the HTTP cache, then map them one by one"""
+        from tum.lib.http_cache import HttpCache
+
+        if http_cache is None:
+            http_cache = HttpCache(HTTP_CACHE_DIR)
+        contents = http_cache.fetch_many(urls)
+        for url, content in zip(urls, contents):
+            g = Graph()
+            g.parse(data=content.decode(), format="turtle")
+            yield url, MosMapping.map_graph(
+                g, dup_record_ids, created_by, linking_cache, stream, max_edit_distance
+            )
+
+    @staticmethod
+    def map_graph(
+        g: Graph,
+        dup_record_ids: bool,
+        created_by: str,
+        linking_cache: Optional[LinkingCache] = None,
+        stream: bool = False,
+        max_edit_distance: int = 0,
+    ) -> list | Iterator[dict]:
+        mapping = MosMapping(
+            g, created_by, linking_cache, max_edit_distance=max_edit_distance
+        )
+        if stream:
+            return mapping.iter_sites(dup_record_ids)
+        return mapping(dup_record_ids)
 
     def __call__(self, dup_record_ids: bool) -> list:
-        doc_nodes = list(self.g.subjects(RDF.type, mos.Document))
+        return list(self.iter_sites(dup_record_ids))
+
+    def iter_sites(
+        self, dup_record_ids: bool, record_ids: Optional[set[str]] = None
+    ) -> Iterator[dict]:
+        """Map the mineral sites and yield them one by one, sorted by their names.
+
+        Records of the same mineral site (same record id) always have the same name, so only the
+        sites of the current name are kept in memory to merge the duplicated records.
+
+        Args:
+            dup_record_ids: whether to allow duplicate record ids
+            record_ids: if provided, only map the sites of these records (the record ids of the other
+                sites are still checked for duplicates)
+        """
+        doc, site_records = self.get_site_records()
+
+        # the sites of the current name (record id -> site, None if it is not mapped), and the
+        # record ids of the previous names
+        sites: dict[str, Optional[dict]] = {}
+        current_site_name = None
+        prev_record_ids = set()
+
+        for site_node, site_name, record_id in tqdm(
+            site_records, total=len(site_records)
+        ):
+            if site_name != current_site_name:
+                yield from (site for site in sites.values() if site is not None)
+                prev_record_ids.update(sites.keys())
+                sites = {}
+                current_site_name = site_name
+
+            if record_id in prev_record_ids:
+                if not dup_record_ids:
+                    raise Exception("Duplicate record id: {}".format(record_id))
+                raise Exception(
+                    "Duplicate record id of mineral sites with different names: {}".format(
+                        record_id
+                    )
+                )
+            elif record_id in sites and not dup_record_ids:
+                raise Exception("Duplicate record id: {}".format(record_id))
+
+            if record_ids is not None and record_id not in record_ids:
+                sites[record_id] = None
+                continue
+
+            invs = []
+            for inv in self.objects(site_node, mos.mineral_inventory):
+                invs.extend(self.map_mineral_inventory(inv, doc))
+
+            site = sites.get(record_id)
+            if site is not None:
+                # we have duplicated record ids when inventories are splitted into multiple rows
+                assert site["location_info"] == self.map_location_info(site_node)
+                assert site["name"] == site_name
+                assert site["deposit_type_candidate"] == [
+                    self.map_deposit_type(deptyp)
+                    for deptyp in self.objects(site_node, mos.deposit_type)
+                ]
+                site["mineral_inventory"].extend(invs)
+            else:
+                site = {
+                    "source_id": doc["uri"],
+                    "record_id": record_id,
+                    "name": site_name,
+                    "location_info": self.map_location_info(site_node),
+                    "deposit_type_candidate": [
+                        self.map_deposit_type(deptyp)
+                        for deptyp in self.objects(site_node, mos.deposit_type)
+                    ],
+                    "mineral_inventory": invs,
+                    "reference": [{"document": doc, "page_info": []}],
+                    "modified_at": datetime.datetime.now(
+                        datetime.timezone.utc
+                    ).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "created_by": self.created_by,
+                }
+
+                if self.has(site_node, mos.site_type):
+                    site["site_type"] = assert_isinstance(
+                        self.map_literal(self.object(site_node, mos.site_type)), str
+                    )
+                sites[record_id] = site
+
+        yield from (site for site in sites.values() if site is not None)
+
+    def get_site_records(
+        self,
+    ) -> tuple[dict, list[tuple[rdflib.term.Node, str, Any]]]:
+        """Get the reference document, and the (node, name, record id) of the mineral sites sorted by
+        their names"""
+        doc_nodes = self.instances.get(mos.Document, [])
         if len(doc_nodes) == 0:
             # no document, they use `source_id`
-            lst = list(self.g.subject_objects(mos.source_id))
-            if len(lst) == 0:
+            if len(self.source_ids) == 0:
                 raise Exception(
                     "No reference document provided. Either use `mos:reference` to a `mos:Document` or `mos:source_id`"
                 )
             doc_node = None
-            source_id = lst[0][1]
+            source_id = self.source_ids[0]
             doc = {"uri": source_id}
         else:
             doc_node = doc_nodes[0]
             doc = self.map_doc(doc_node)
 
-        sites = {}
         site_names = [
             (
                 site,
                 assert_isinstance(self.map_literal(self.object(site, mos.name)), str),
             )
-            for site in self.g.subjects(RDF.type, mos.MineralSite)
+            for site in self.instances.get(mos.MineralSite, [])
         ]
 
         is_site_name_uniques = len(site_names) == len(set([x[1] for x in site_names]))
@@ -98,13 +370,10 @@ class MosMapping:
         if doc_node is not None and self.has(doc_node, mos.record_type):
             record_type = self.map_literal(self.object(doc_node, mos.record_type))
 
-        for ri, (site_node, site_name) in tqdm(
-            enumerate(sorted(site_names, key=lambda x: x[1])), total=len(site_names)
+        site_records = []
+        for ri, (site_node, site_name) in enumerate(
+            sorted(site_names, key=lambda x: x[1])
         ):
-            invs = []
-            for inv in self.g.objects(site_node, mos.mineral_inventory):
-                invs.extend(self.map_mineral_inventory(inv, doc))
-
             if self.has(site_node, mos.row_index):
                 ri = self.map_literal(self.object(site_node, mos.row_index))
                 record_id = f"{slugify(site_name)}__{ri}"
@@ -125,45 +394,108 @@ class MosMapping:
                 record_id += "__" + str(ri)
             else:
                 raise Exception("No record id")
+            site_records.append((site_node, site_name, record_id))
+        return doc, site_records
+
+    def get_record_fingerprints(self) -> dict[str, str]:
+        """Get the fingerprint of each record from the triples of its mineral sites (including their
+        inventories, deposit types, etc.), and of the document, the creator, and the version of the
+        mapping, which the mapped sites also depend on"""
+        doc, site_records = self.get_site_records()
+        # the linker ids include the versions of their entities
+        context = [
+            MOS_MAPPING_VERSION,
+            self.created_by,
+            orjson_dumps(doc).decode(),
+            sorted(self.linking_cache.linkers.keys()),
+        ]
 
-            if record_id in sites:
-                if not dup_record_ids:
-                    raise Exception("Duplicate record id: {}".format(record_id))
+        record_fps: dict[str, list[str]] = {}
+        memo = {}
+        for site_node, _, record_id in site_records:
+            record_fps.setdefault(record_id, []).append(
+                self.get_node_fingerprint(site_node, memo, set())
+            )
+        return {
+            record_id: xxhash.xxh3_128_hexdigest(orjson.dumps(context + sorted(fps)))
+            for record_id, fps in record_fps.items()
+        }
+
+    def get_node_fingerprint(
+        self, node: rdflib.term.Node, memo: dict, ancestors: set
+    ) -> str:
+        """Fingerprint of the triples reachable from a node. Blank nodes are fingerprinted by their
+        content only, so the fingerprints do not change when the graph is parsed again.
+        """
+        if node in memo:
+            return memo[node]
+
+        ancestors.add(node)
+        parts = []
+        for prop, objs in self.index.get(node, EMPTY_PROPS).items():
+            for obj in objs:
+                if (
+                    prop != RDF.type
+                    and obj not in ancestors
+                    and obj in self.index
+                    and obj not in self.instances.get(mos.Document, EMPTY_OBJECTS)
+                ):
+                    part = self.get_node_fingerprint(obj, memo, ancestors)
                 else:
-                    # we have duplicated record ids when inventories are splitted into multiple rows
-                    assert sites[record_id]["location_info"] == self.map_location_info(
-                        site_node
-                    )
-                    assert sites[record_id]["name"] == site_name
-                    assert sites[record_id]["deposit_type_candidate"] == [
-                        self.map_deposit_type(deptyp)
-                        for deptyp in self.g.objects(site_node, mos.deposit_type)
-                    ]
-                    sites[record_id]["mineral_inventory"].extend(invs)
-            else:
-                sites[record_id] = {
-                    "source_id": doc["uri"],
-                    "record_id": record_id,
-                    "name": site_name,
-                    "location_info": self.map_location_info(site_node),
-                    "deposit_type_candidate": [
-                        self.map_deposit_type(deptyp)
-                        for deptyp in self.g.objects(site_node, mos.deposit_type)
-                    ],
-                    "mineral_inventory": invs,
-                    "reference": [{"document": doc, "page_info": []}],
-                    "modified_at": datetime.datetime.now(
-                        datetime.timezone.utc
-                    ).strftime("%Y-%m-%dT%H:%M:%SZ"),
-                    "created_by": self.created_by,
-                }
+                    part = obj.n3()
+                parts.append((prop.n3(), part))
+        ancestors.remove(node)
 
-                if self.has(site_node, mos.site_type):
-                    sites[record_id]["site_type"] = assert_isinstance(
-                        self.map_literal(self.object(site_node, mos.site_type)), str
-                    )
+        parts.sort()
+        if not isinstance(node, rdflib.term.BNode):
+            parts.append(("", node.n3()))
+        memo[node] = xxhash.xxh3_128_hexdigest(orjson.dumps(parts))
+        return memo[node]
 
-        return list(sites.values())
+    def map_delta(
+        self,
+        dup_record_ids: bool,
+        prev_sites: list[dict],
+        prev_fingerprints: Optional[dict[str, str]] = None,
+    ) -> MosDelta:
+        """Map the sites that have changed compared to the previous mapping of the graph.
+
+        If the fingerprints of the previous records are provided, only the records whose triples have
+        changed are mapped. Otherwise, all records are mapped and compared with the previous sites.
+        """
+        fingerprints = self.get_record_fingerprints()
+        id2prev_site = {site["record_id"]: site for site in prev_sites}
+
+        if prev_fingerprints is not None:
+            record_ids = {
+                record_id
+                for record_id, fp in fingerprints.items()
+                if prev_fingerprints.get(record_id) != fp
+                or record_id not in id2prev_site
+            }
+        else:
+            record_ids = None
+
+        delta = MosDelta(fingerprints=fingerprints)
+        for site in self.iter_sites(dup_record_ids, record_ids):
+            prev_site = id2prev_site.get(site["record_id"])
+            if prev_site is None:
+                delta.added.append(site)
+            elif normalize_site(site) != normalize_site(prev_site):
+                delta.changed.append(site)
+            else:
+                # same content, keep the previous site so its modification time is unchanged
+                delta.unchanged.append(prev_site)
+        if record_ids is not None:
+            delta.unchanged.extend(
+                site
+                for record_id, site in id2prev_site.items()
+                if record_id in fingerprints and record_id not in record_ids
+            )
+        delta.removed = [
+            record_id for record_id in id2prev_site if record_id not in fingerprints
+        ]
+        return delta
 
     def map_doc(self, doc: rdflib.term.Node) -> dict:
         output = {}
@@ -188,7 +520,7 @@ class MosMapping:
 
         if self.has(doc, mos.author):
             output["authors"] = [
-                self.map_literal(author) for author in self.g.objects(doc, mos.author)
+                self.map_literal(author) for author in self.objects(doc, mos.author)
             ]
         return output
 
@@ -197,7 +529,7 @@ class MosMapping:
         if self.has(site, mos.country):
             output["country"] = [
                 self.get_candidate(obj, self.country_linker)
-                for obj in self.g.objects(site, mos.country)
+                for obj in self.objects(site, mos.country)
             ]
         if self.has(site, mos.state_or_province):
             output["state_or_province"] = [
@@ -205,7 +537,7 @@ class MosMapping:
                     obj,
                     self.state_or_province_linker,
                 )
-                for obj in self.g.objects(site, mos.state_or_province)
+                for obj in self.objects(site, mos.state_or_province)
             ]
         if self.has(site, mos.location):
             output["location"] = assert_isinstance(
@@ -280,7 +612,7 @@ class MosMapping:
             if self.has(inv, mos.category):
                 # handle Measure+Indicated
                 inv_cat_lst = []
-                for cat in self.g.objects(inv, mos.category):
+                for cat in self.objects(inv, mos.category):
                     if isinstance(cat, rdflib.term.Literal) and "+" in str(cat):
                         inv_cat_lst.extend(
                             (rdflib.term.Literal(x) for x in str(cat).split("+"))
@@ -407,15 +739,19 @@ class MosMapping:
         raise Exception("Unreachable")
 
     def has(self, subj: rdflib.term.Node, prop: rdflib.term.Node) -> bool:
-        return (subj, prop, None) in self.g
+        return prop in self.index.get(subj, EMPTY_PROPS)
 
     def object(self, subj: rdflib.term.Node, prop: URIRef) -> rdflib.term.Node:
-        try:
-            (obj,) = list(self.g.objects(subj, prop))
-        except:
-            print(subj, prop, list(self.g.objects(subj, prop)))
-            raise
-        return obj
+        objs = self.objects(subj, prop)
+        if len(objs) != 1:
+            print(subj, prop, objs)
+            raise ValueError(f"Expect exactly one object but got {len(objs)}")
+        return objs[0]
+
+    def objects(
+        self, subj: rdflib.term.Node, prop: rdflib.term.Node
+    ) -> list[rdflib.term.Node]:
+        return self.index.get(subj, EMPTY_PROPS).get(prop, EMPTY_OBJECTS)
 
     def map_uri(self, val: rdflib.term.Node) -> str:
         assert isinstance(val, rdflib.term.URIRef), val
@@ -493,6 +829,30 @@ def main(
     dup_record_id: bool = typer.Option(
         True, help="Whether to allow duplicate record ids"
     ),
+    linking_cache: Optional[Path] = typer.Option(
+        None, help="JSON file to persist the entity linking results across runs"
+    ),
+    report_linking_cache: bool = typer.Option(
+        False, help="Whether to print the hit rates of the entity linking cache"
+    ),
+    workers: int = typer.Option(
+        1, help="Number of worker processes to map multiple files in parallel"
+    ),
+    format: OutputFormat = typer.Option(
+        OutputFormat.json,
+        help="Output format: indented JSON, compact JSON, or newline-delimited JSON (one site per line). The last two are streamed with bounded memory",
+    ),
+    http_cache: Path = typer.Option(
+        HTTP_CACHE_DIR, help="Directory to cache the TTL files fetched from URLs"
+    ),
+    previous: Optional[Path] = typer.Option(
+        None,
+        help="Previous output of the file (JSON or NDJSON). If provided, only the changed sites are mapped, and the added/changed/removed sites are written to <name>.delta.json",
+    ),
+    max_edit_distance: int = typer.Option(
+        0,
+        help="Maximum edit distance to correct the typos (e.g., OCR errors) of the units and commodities before linking them, 0 to disable the correction",
+    ),
 ):
     assert (
         created_by.startswith("s/")
@@ -505,20 +865,301 @@ def main(
     print("Expect duplicate record ids:", dup_record_id)
     print("Created by:", created_by)
 
-    if file.startswith("http://") or file.startswith("https://"):
-        serde.json.ser(
-            MosMapping.map(file, dup_record_id, created_by),
-            Path(outdir) / "data.json",
-            indent=2,
+    cache = LinkingCache(linking_cache)
+    if previous is not None:
+        is_url = file.startswith("http://") or file.startswith("https://")
+        infiles = [file] if is_url else glob.glob(file)
+        assert len(infiles) == 1, "The delta mode maps one file at a time"
+        name = "data" if is_url else Path(infiles[0]).stem
+        delta = map_file_delta(
+            infiles[0],
+            Path(outdir) / (name + format.ext),
+            previous,
+            dup_record_id,
+            created_by,
+            cache,
+            format,
+            max_edit_distance,
+        )
+        print(
+            f"Delta: {len(delta.added)} added, {len(delta.changed)} changed, "
+            f"{len(delta.removed)} removed, {len(delta.unchanged)} unchanged"
+        )
+    elif file.startswith("http://") or file.startswith("https://"):
+        # a comma-separated list of URLs, fetched concurrently
+        from tum.lib.http_cache import HttpCache
+
+        urls = list(dict.fromkeys(file.split(",")))
+        fetcher = HttpCache(http_cache)
+        for url, sites in MosMapping.map_urls(
+            urls,
+            dup_record_id,
+            created_by,
+            cache,
+            stream=True,
+            http_cache=fetcher,
+            max_edit_distance=max_edit_distance,
+        ):
+            name = "data" if len(urls) == 1 else get_url_output_name(url)
+            write_sites(sites, Path(outdir) / (name + format.ext), format)
+        print(
+            "HTTP cache: {hits} hits, {revalidated} revalidated, {misses} downloaded".format(
+                **fetcher.stats()
+            )
+        )
+    elif workers > 1:
+        map_files_parallel(
+            glob.glob(file),
+            Path(outdir),
+            dup_record_id,
+            created_by,
+            cache,
+            workers,
+            format,
+            max_edit_distance,
         )
     else:
         for infile in glob.glob(file):
-            serde.json.ser(
-                MosMapping.map(infile, dup_record_id, created_by),
-                Path(outdir) / (Path(infile).stem + ".json"),
-                indent=2,
+            write_sites(
+                MosMapping.map(
+                    infile,
+                    dup_record_id,
+                    created_by,
+                    cache,
+                    stream=True,
+                    max_edit_distance=max_edit_distance,
+                ),
+                Path(outdir) / (Path(infile).stem + format.ext),
+                format,
+            )
+
+    if linking_cache is not None:
+        cache.save()
+    if report_linking_cache:
+        for name, stats in cache.report().items():
+            print(
+                f"Linking cache of {name}: {stats['hits']} hits, {stats['misses']} misses, "
+                f"hit rate {stats['hit_rate']:.2%}, size {stats['size']}"
             )
 
 
+def map_file_delta(
+    infile: str,
+    outfile: Path,
+    previous: Path,
+    dup_record_ids: bool,
+    created_by: str,
+    linking_cache: Optional[LinkingCache] = None,
+    format: OutputFormat = OutputFormat.json,
+    max_edit_distance: int = 0,
+) -> MosDelta:
+    """Map a file against its previous output, writing the changes to `<name>.delta.json`, and all
+    the current sites to `outfile`.
+
+    The fingerprints of the records are written next to the output (`<name>.fingerprints.json`) so
+    the next run only maps the records that have changed. Without the fingerprints of the previous
+    output, all records are mapped and compared with the previous sites.
+    """
+    g = MosMapping.load_graph(infile)
+    mapping = MosMapping(
+        g, created_by, linking_cache, max_edit_distance=max_edit_distance
+    )
+    delta = mapping.map_delta(
+        dup_record_ids,
+        read_sites(previous),
+        read_fingerprints(get_fingerprint_file(previous)),
+    )
+
+    outfile.parent.mkdir(parents=True, exist_ok=True)
+    delta_file = outfile.parent / f"{outfile.stem}.delta.json"
+    serde.json.ser(delta.to_dict(), delta_file, indent=2)
+    write_sites(delta.get_sites(), outfile, format)
+    write_fingerprints(get_fingerprint_file(outfile), delta.fingerprints)
+    return delta
+
+
+def map_files_parallel(
+    infiles: list[str],
+    outdir: Path,
+    dup_record_ids: bool,
+    created_by: str,
+    linking_cache: LinkingCache,
+    workers: int,
+    format: OutputFormat = OutputFormat.json,
+    max_edit_distance: int = 0,
+):
+    """Map files using a pool of processes, each process loads the linkers once and maps many files.
+    The linking results of the workers are merged into `linking_cache`."""
+    failures = []
+    # load the prebuilt linkers before forking so the workers inherit them instead of loading them
+    load_linker_index(PREDEFINED_ENTITY_DIR)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_map_worker,
+        initargs=(created_by, linking_cache.cache_file, max_edit_distance),
+    ) as executor:
+        futures = {
+            executor.submit(
+                _map_file_worker,
+                infile,
+                outdir,
+                dup_record_ids,
+                created_by,
+                format,
+                max_edit_distance,
+            ): infile
+            for infile in infiles
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="map"):
+            try:
+                error, updates = future.result()
+            except Exception:
+                # the worker died
+                error, updates = traceback.format_exc(), {}
+            linking_cache.merge(updates)
+            if error is not None:
+                failures.append((futures[future], error))
+
+    print(f"Mapped {len(infiles) - len(failures)}/{len(infiles)} files successfully")
+    for infile, error in failures:
+        print(f"Failed to map {infile}:\n{error}")
+
+
+# linking cache of the worker processes of `map_files_parallel`
+_worker_linking_cache: Optional[LinkingCache] = None
+
+
+def _init_map_worker(
+    created_by: str, linking_cache_file: Optional[Path], max_edit_distance: int
+):
+    global _worker_linking_cache
+    _worker_linking_cache = LinkingCache(linking_cache_file)
+    # load the linkers once per worker
+    MosMapping(
+        Graph(),
+        created_by,
+        _worker_linking_cache,
+        max_edit_distance=max_edit_distance,
+    )
+
+
+def _map_file_worker(
+    infile: str,
+    outdir: Path,
+    dup_record_ids: bool,
+    created_by: str,
+    format: OutputFormat,
+    max_edit_distance: int,
+) -> tuple[Optional[str], dict]:
+    assert _worker_linking_cache is not None
+    try:
+        write_sites(
+            MosMapping.map(
+                infile,
+                dup_record_ids,
+                created_by,
+                _worker_linking_cache,
+                stream=True,
+                max_edit_distance=max_edit_distance,
+            ),
+            outdir / (Path(infile).stem + format.ext),
+            format,
+        )
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return error, _worker_linking_cache.pop_updates()
+
+
+def get_url_output_name(url: str) -> str:
+    """Get the name of the output file of a URL. URLs of the same file name (e.g., `.../a/data.ttl` and
+    `.../b/data.ttl`) get different names as the name is suffixed with a hash of the URL
+    """
+    stem = Path(urlparse(url).path).stem or "data"
+    return f"{stem}_{xxhash.xxh3_64_hexdigest(url.encode())[:8]}"
+
+
+def write_sites(
+    sites: Iterable[dict], outfile: Path, format: OutputFormat = OutputFormat.json
+):
+    """Write the mapped sites to a temporary file then rename it, so readers never see a partial file.
+
+    The compact JSON and NDJSON formats are written site by site, so only one site is serialized at a time.
+    """
+    tmpfile = outfile.parent / f".{outfile.name}.{uuid.uuid4().hex}.tmp"
+    try:
+        if format == OutputFormat.json:
+            serde.json.ser(list(sites), tmpfile, indent=2)
+        else:
+            with open(tmpfile, "wb") as f:
+                if format == OutputFormat.ndjson:
+                    for site in sites:
+                        f.write(orjson_dumps(site, option=orjson.OPT_NON_STR_KEYS))
+                        f.write(b"\n")
+                else:
+                    f.write(b"[")
+                    for i, site in enumerate(sites):
+                        if i > 0:
+                            f.write(b",")
+                        f.write(orjson_dumps(site, option=orjson.OPT_NON_STR_KEYS))
+                    f.write(b"]")
+        os.replace(tmpfile, outfile)
+    finally:
+        if tmpfile.exists():
+            tmpfile.unlink()
+
+
+def read_sites(infile: Path) -> list[dict]:
+    """Read the sites written by `write_sites` (JSON or NDJSON)"""
+    if infile.suffix == OutputFormat.ndjson.ext:
+        with open(infile, "rb") as f:
+            return [orjson.loads(line) for line in f if line.strip()]
+    return orjson.loads(infile.read_bytes())
+
+
+def normalize_site(site: dict) -> dict:
+    """Get the JSON representation of a site without its modification time, for comparison.
+
+    The lists (mineral inventories, deposit types, etc.) are sorted as their order depends on the order
+    of the triples in the parsed graph, which may differ between runs of the same file.
+    """
+    site = orjson.loads(orjson_dumps(site, option=orjson.OPT_NON_STR_KEYS))
+    site.pop("modified_at", None)
+    return sort_json_lists(site)
+
+
+def sort_json_lists(value: Any) -> Any:
+    """Recursively sort the lists of a JSON value by the serialized JSON of their items"""
+    if isinstance(value, dict):
+        return {k: sort_json_lists(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return sorted(
+            (sort_json_lists(v) for v in value),
+            key=lambda v: orjson.dumps(v, option=orjson.OPT_SORT_KEYS),
+        )
+    return value
+
+
+def get_fingerprint_file(outfile: Path) -> Path:
+    return outfile.parent / f"{outfile.stem}.fingerprints.json"
+
+
+def read_fingerprints(infile: Path) -> Optional[dict[str, str]]:
+    if not infile.exists():
+        return None
+    record = orjson.loads(infile.read_bytes())
+    if record["version"] != MOS_MAPPING_VERSION:
+        return None
+    return record["records"]
+
+
+def write_fingerprints(outfile: Path, fingerprints: dict[str, str]):
+    tmpfile = outfile.parent / f".{outfile.name}.{uuid.uuid4().hex}.tmp"
+    tmpfile.write_bytes(
+        orjson.dumps({"version": MOS_MAPPING_VERSION, "records": fingerprints})
+    )
+    os.replace(tmpfile, outfile)
+
+
 if __name__ == "__main__":
     app()
@@ -68,4 +68,12 @@ class MNDRNamespace(DefaultKnowledgeGraphNamespace):
         return self.get_rel_uri(uri)
 
 
+class FixMNDRNamespace(MNDRNamespace):
+    def id_to_uri(self, id: str) -> str:
+        return str(id)
+
+    def uri_to_id(self, uri: str) -> str:
+        return str(uri)
+
+
 register_kgns(MNR, MNDRNamespace.create())